@@ -24,6 +24,7 @@ import uuid
 from typing import Any, Dict, Optional
 
 import aiohttp
+import orjson
 
 from config import Config
 
@@ -75,14 +76,15 @@ async def ask_agent(user_id: int, request_text: str) -> Dict[str, Any]:
 
     try:
         async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.post(url, headers=headers, json=payload) as response:
-                text_body = await response.text()
+            # Тело уже сериализовано в байты через orjson, ответ читаем один раз и разбираем им же
+            async with session.post(url, headers=headers, data=orjson.dumps(payload)) as response:
+                body = await response.read()
                 if response.status != 200:
                     logger.error(
-                        f"AI-агент вернул HTTP {response.status}: {text_body[:300]}"
+                        f"AI-агент вернул HTTP {response.status}: {body[:300].decode(errors='replace')}"
                     )
                     raise AIAgentError(f"HTTP {response.status}")
-                data = await response.json()
+                data = orjson.loads(body)
     except aiohttp.ClientError as exc:
         logger.error(f"AI-агент сетевая ошибка: {exc}")
         raise AIAgentError(f"Сетевая ошибка: {exc}") from exc
@@ -1,8 +1,9 @@
 import logging
+from collections import defaultdict
 
 from typing import Dict, List
 
-from app.db.nocodb_client import NocoDBClient
+from app.db.nocodb_client import nocodb_client
 from app.services.utils import mask_pii
 from config import Config
 
@@ -11,7 +12,17 @@ logger = logging.getLogger(__name__)
 
 
 
-# Методы для авторизационной таблицы
+def _log_bulk_result(action: str, done: int, total: int):
+    """Пишет в лог итог пакетной операции: сколько строк записано и сколько не удалось"""
+    if done < total:
+        logger.error("%s записей в авторизационной таблице: %s из %s, не удалось: %s", action, done, total, total - done)
+    else:
+        logger.info("%s записей в авторизационной таблице: %s", action, done)
+
+
+# Методы для авторизационной таблицы.
+# Все они идут через общий nocodb_client: синхронизация вызывает их подряд,
+# и каждый вызов переиспользует соединения пула вместо нового рукопожатия
 
 async def read_auth() -> Dict[str, List[Dict]]:
     """
@@ -19,89 +30,102 @@ async def read_auth() -> Dict[str, List[Dict]]:
     Возвращает словарь {snils: [записи_по_телефонам]}
     """
     try:
-        async with NocoDBClient() as client:
-            auth_users = await client.get_all(table_id=Config.AUTH_TABLE_ID)
+        auth_users = await nocodb_client.get_all(table_id=Config.AUTH_TABLE_ID)
 
         if not auth_users:
             return {}
 
         # Группируем по СНИЛС, так как у одного пользователя может быть несколько записей
-        grouped_by_snils = {}
+        grouped_by_snils = defaultdict(list)
         for user in auth_users:
             snils = user.get('SNILS')
             if snils:
-                if snils not in grouped_by_snils:
-                    grouped_by_snils[snils] = []
                 grouped_by_snils[snils].append(user)
 
-        return grouped_by_snils
+        # Обычный dict, чтобы проверка отсутствующего СНИЛС не добавляла пустой список
+        return dict(grouped_by_snils)
 
     except Exception as e:
-        logger.error(f"Ошибка получения пользователей из таблицы авторизации: {e}")
+        logger.error("Ошибка получения пользователей из таблицы авторизации: %s", e)
         return {}
 
 
-async def create_auth(auth_record: Dict) -> bool:
+async def get_auth_by_snils(snils: str) -> List[Dict]:
     """
-    Создает запись пользователя в таблице авторизации NocoDB
+    Получает записи одного пользователя из таблицы авторизации NocoDB по СНИЛС.
+    Фильтрует на стороне сервера, не загружая всю таблицу.
+    Возвращает список записей (по одной на телефон)
     """
     try:
-        async with NocoDBClient() as client:
-            result = await client.create_record(
-                table_id=Config.AUTH_TABLE_ID,
-                data=auth_record
-            )
-
-            if result:
-                logger.info(f"Создана запись в авторизационной таблице: {mask_pii(auth_record.get('FIO'))}")
-                return True
-            else:
-                logger.error(f"Ошибка создания записи в авторизационной таблице: {mask_pii(auth_record.get('FIO'))}")
-                return False
+        return await nocodb_client.get_all(
+            table_id=Config.AUTH_TABLE_ID,
+            where=f"(SNILS,eq,{snils})"
+        )
 
     except Exception as e:
-        logger.error(f"Ошибка создания записи в авторизационной таблице: {e}")
-        return False
+        logger.error("Ошибка получения записей авторизационной таблицы для %s: %s", mask_pii(snils), e)
+        return []
 
 
-async def update_auth(record_id: str, auth_record: Dict) -> bool:
+async def create_auth_bulk(auth_records: List[Dict]) -> int:
     """
-    Обновляет запись пользователя в таблице авторизации NocoDB
+    Создает несколько записей в таблице авторизации NocoDB пачками по 100 строк.
+    Ошибка одной пачки не отменяет остальные. Возвращает число реально созданных записей
     """
+    if not auth_records:
+        return 0
+
     try:
-        async with NocoDBClient() as client:
-            await client.update_record(
-                table_id=Config.AUTH_TABLE_ID,
-                record_id=record_id,
-                data=auth_record
-            )
+        created = await nocodb_client.create_records(
+            table_id=Config.AUTH_TABLE_ID,
+            rows=auth_records
+        )
+    except Exception as e:
+        logger.error("Ошибка пакетного создания записей в авторизационной таблице: %s", e)
+        return 0
 
-            logger.debug(f"Обновлена запись в авторизационной таблице: {record_id}")
-            return True
+    _log_bulk_result("Создано", len(created), len(auth_records))
+    return len(created)
 
+
+async def update_auth_bulk(auth_records: List[Dict]) -> int:
+    """
+    Обновляет несколько записей таблицы авторизации NocoDB одним PATCH на каждые 100 строк.
+    Каждая запись должна содержать Id. Ошибка одной пачки не отменяет остальные.
+    Возвращает число реально обновлённых записей
+    """
+    if not auth_records:
+        return 0
+
+    try:
+        updated = await nocodb_client.update_records(
+            table_id=Config.AUTH_TABLE_ID,
+            rows=auth_records
+        )
     except Exception as e:
-        logger.error(f"Ошибка обновления записи в авторизационной таблице: {e}")
-        return False
+        logger.error("Ошибка пакетного обновления записей в авторизационной таблице: %s", e)
+        return 0
+
+    _log_bulk_result("Обновлено", len(updated), len(auth_records))
+    return len(updated)
 
 
-async def delete_auth(record_id: str) -> bool:
+async def delete_auth_bulk(record_ids: List[str]) -> int:
     """
-    Удаляет запись пользователя из таблицы авторизации NocoDB
+    Удаляет несколько записей из таблицы авторизации NocoDB пачками по 100 строк.
+    Ошибка одной пачки не отменяет остальные. Возвращает число реально удалённых записей
     """
-    try:
-        async with NocoDBClient() as client:
-            deleted = await client.delete_record(
-                table_id=Config.AUTH_TABLE_ID,
-                record_id=record_id
-            )
-
-            if deleted:
-                logger.info(f"Удалена запись из авторизационной таблицы: {record_id}")
-                return True
-            else:
-                logger.error(f"Ошибка удаления записи из авторизационной таблицы: {record_id}")
-                return False
+    if not record_ids:
+        return 0
 
+    try:
+        deleted = await nocodb_client.delete_records(
+            table_id=Config.AUTH_TABLE_ID,
+            record_ids=record_ids
+        )
     except Exception as e:
-        logger.error(f"Ошибка удаления записи из авторизационной таблицы: {e}")
-        return False
+        logger.error("Ошибка пакетного удаления записей из авторизационной таблицы: %s", e)
+        return 0
+
+    _log_bulk_result("Удалено", len(deleted), len(record_ids))
+    return len(deleted)
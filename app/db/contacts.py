@@ -1,30 +1,43 @@
-import pprint
-import re
+import asyncio
 import logging
-from typing import List, Dict, Any
+import unicodedata
+from functools import lru_cache
+from typing import List, Dict, Optional, Set, Tuple, Iterable
 from collections import defaultdict
 
-from app.db.nocodb_client import NocoDBClient
+from cachetools import TTLCache
+
+from app.db.directory_index import DirectoryIndex
+from app.db.nocodb_client import nocodb_client
+from app.db.table_data import load_table_snapshot, refresh_table_snapshot
 from app.services.utils import mask_pii
 
 
 logger = logging.getLogger(__name__)
 
+# Сегменты холдинга как битовые маски: сотрудник "ОБА" попадает в оба фильтра
+_SEGMENT_MASKS = {"МАВИС": 0b01, "ВОТОНЯ": 0b10, "ОБА": 0b11}
+_SEGMENT_FILTERS = {"mavis": 0b01, "votonia": 0b10}
+
+# Как часто фоновая задача обновляет снимок справочника, сек
+DIRECTORY_REFRESH_INTERVAL = 240
+
+# table_id -> (записи справочника, индекс по ним); TTL с запасом больше интервала обновления.
+# Телефонные книги, магазины и аптеки фоновой задачей не обновляются и живут в кеше TTL после первой загрузки
+directory_cache = TTLCache(maxsize=8, ttl=300)
+
 
 async def get_department_list(table_id: str) -> List[str]:
     """
     Получает список отделов из таблицы ATS_MAVIS_BOOK_ID или ATS_VOTONIA_BOOK_ID.
-    Запрашивает все записи, извлекает уникальные значения поля Department.
+    Читает таблицу постранично и только колонку Department, собирает уникальные значения.
     """
     try:
         departments = set()
 
-        async with NocoDBClient() as client:
-            # Получаем все записи из таблицы ATS_BOOK_ID
-            records = await client.get_all(table_id)
-
+        async for page in nocodb_client.iter_all(table_id, fields=["Department"], limit=1000):
             # Собираем уникальные значения Department
-            for record in records:
+            for record in page:
                 department = record.get("Department")
                 if department:  # Проверяем что не None и не пустая строка
                     departments.add(department)
@@ -37,213 +50,343 @@ async def get_department_list(table_id: str) -> List[str]:
         return []
 
 
+def _fold(text: str) -> str:
+    """Приводит строку к единому виду для сравнения: NFKC и регистронезависимая форма"""
+    return unicodedata.normalize("NFKC", text).casefold()
+
+
+@lru_cache(maxsize=1024)
+def _query_words(search_query: str) -> Tuple[str, ...]:
+    """Нормализует поисковый запрос и разбивает на слова. Частые запросы берутся из кеша"""
+    return tuple(_fold(search_query).split())
+
+
+def prepare_employees(employees: List[Dict]) -> List[Dict]:
+    """
+    Добавляет в записи справочника нормализованные (см. _fold) поля для поиска:
+    _fio_lc (фамилия и имя), _first_name_lc, _loc_lc, _dept_lc и маску сегмента _seg_mask.
+    Уже подготовленные записи пропускает, поэтому для кешированного снимка работа делается один раз.
+    """
+    for emp in employees:
+        if "_fio_lc" in emp:
+            continue
+
+        # Берём первые два слова ФИО (фамилия и имя), если слово одно — используем его
+        name_parts = _fold(emp.get("FIO") or "").split()
+        emp["_fio_lc"] = " ".join(name_parts[:2])
+        emp["_first_name_lc"] = name_parts[1] if len(name_parts) >= 2 else emp["_fio_lc"]
+        emp["_loc_lc"] = _fold(emp.get("Location") or "")
+        emp["_dept_lc"] = _fold(emp.get("Department") or "")
+
+        company_segment = emp.get("Company_segment")
+        emp["_seg_mask"] = _SEGMENT_MASKS.get(company_segment, 0) if isinstance(company_segment, str) else 0
+
+    return employees
+
+
+def build_directory_index(employees: List[Dict]) -> DirectoryIndex:
+    """Строит индекс для поиска по ФИО и локации"""
+    prepare_employees(employees)
+    return DirectoryIndex(employees, {"FIO": lambda e: e["_fio_lc"], "Location": lambda e: e["_loc_lc"]})
+
+
+def _cache_directory(table_id: str, records: List[Dict]) -> Tuple[List[Dict], Optional[DirectoryIndex]]:
+    """Строит индекс по снимку таблицы и кладёт пару в кеш справочника"""
+    if not records:
+        # Пустой ответ не кешируем — это может быть ошибка запроса
+        return records, None
+
+    index = build_directory_index(records)
+    directory_cache[table_id] = (records, index)
+    return records, index
+
+
+async def refresh_directory(table_id: str) -> Tuple[List[Dict], Optional[DirectoryIndex]]:
+    """Заново загружает общий снимок таблицы, строит индекс и кладёт справочник в кеш"""
+    records = await refresh_table_snapshot(table_id)
+    return _cache_directory(table_id, records)
+
+
+async def load_directory(table_id: str) -> Tuple[List[Dict], Optional[DirectoryIndex]]:
+    """
+    Возвращает записи справочника и индекс для поиска по ФИО и локации.
+    Снимок обычно уже прогрет фоновой задачей start_directory_refresher,
+    если нет — загружается по запросу.
+    Так же берутся телефонные книги, магазины и аптеки: фильтр like на сервере NocoDB
+    не везде регистронезависим для кириллицы, поэтому совпадения ищем только по снимку (_fold)
+    """
+    if table_id in directory_cache:
+        return directory_cache[table_id]
+    records = await load_table_snapshot(table_id)
+    return _cache_directory(table_id, records)
+
+
+async def start_directory_refresher(table_ids: List[str]):
+    """Держит снимки справочников с индексом в кеше, обновляя их в фоне"""
+    logger.info(f"Фоновое обновление справочника каждые {DIRECTORY_REFRESH_INTERVAL} сек")
+
+    while True:
+        for table_id in table_ids:
+            try:
+                await refresh_directory(table_id)
+            except Exception as e:
+                logger.error(f"Ошибка обновления справочника {table_id}: {e}")
+
+        await asyncio.sleep(DIRECTORY_REFRESH_INTERVAL)
+
+
+def _intersect(id_sets: Iterable[Optional[Set[int]]]) -> Optional[Set[int]]:
+    """Пересекает множества номеров строк, None (нет ограничения) пропускает"""
+    result = None
+    for ids in id_sets:
+        if ids is None:
+            continue
+        result = set(ids) if result is None else result & ids
+    return result
+
+
+def _fio_candidates(index: DirectoryIndex, query_words: Tuple[str, ...], normalized_query_variants: List[Tuple[str, ...]],
+                    was_normalized: List[bool]) -> Optional[Set[int]]:
+    """
+    Отбирает по индексу строки, которые могут совпасть по ФИО или по локации.
+    Возвращает None, если индекс не может сузить перебор.
+    """
+    single_word = len(query_words) == 1
+
+    name_sets = []
+    for variants, normalized in zip(normalized_query_variants[:2], was_normalized[:2]):
+        word_ids = set()
+        for variant in variants:
+            if single_word and normalized:
+                # Нормализованное имя сравнивается целиком
+                variant_ids = index.by_token("FIO", variant)
+            else:
+                variant_ids = index.by_substring("FIO", variant)
+            if variant_ids is None:
+                word_ids = None
+                break
+            word_ids |= variant_ids
+        name_sets.append(word_ids)
+
+    name_ids = _intersect(name_sets)
+    location_ids = _intersect(index.by_substring("Location", word) for word in query_words[:2])
+
+    if name_ids is None or location_ids is None:
+        return None
+    return name_ids | location_ids
+
+
+# Уменьшительные имена -> варианты полного имени для поиска по ФИО
+NICKNAME_MAP: Dict[str, Tuple[str, ...]] = {
+    # Женские имена
+    "настя": ("анастасия",), "настюша": ("анастасия",),
+    "геля": ("ангелина",),
+    "лика": ("анжелика",),
+    "аня": ("анна",),
+    "тоня": ("антонина", "тоня"),
+    "лера": ("валерия",),
+    "вика": ("виктория",),
+    "галя": ("галина",),
+    "даша": ("дарья",),
+    "катя": ("екатерина", "катерина"), "катюша": ("екатерина", "катерина"),
+    "лена": ("елена",),
+    "лиза": ("елизавета",),
+    "зина": ("зинаида",),
+    "ира": ("ирина",),
+    "ксюша": ("ксения",),
+    "лида": ("лидия",),
+    "лиля": ("лилия",),
+    "люба": ("любовь",),
+    "люда": ("людмила",),
+    "марго": ("маргарита",),
+    "мариша": ("марина",),
+    "маша": ("мария", "марья"),
+    "надя": ("надежда",),
+    "наташа": ("наталья", "наталия"),
+    "леся": ("олеся",),
+    "оля": ("ольга",),
+    "поля": ("полина",),
+    "рая": ("раиса",),
+    "света": ("светлана",),
+    "соня": ("софия", "софья"),
+    "тая": ("таисия",),
+    "тома": ("тамара",),
+    "таня": ("татьяна",),
+    "уля": ("ульяна",),
+    "юля": ("юлия",),
+
+    # Мужские имена
+    "лёша": ("алексей",), "алёша": ("алексей",), "леша": ("алексей",),
+    "толя": ("анатолий",),
+    "аркаша": ("аркадий",),
+    "тема": ("артем",),
+    "боря": ("борис",),
+    "вадик": ("вадим",),
+    "вася": ("василий",),
+    "витя": ("виктор",),
+    "виталик": ("виталий",),
+    "володя": ("владимир",), "вова": ("владимир",),
+    "влад": ("владислав",),
+    "гена": ("геннадий",),
+    "гоша": ("георгий",), "жора": ("георгий",),
+    "гриша": ("григорий",),
+    "даня": ("даниил",),
+    "ден": ("денис",),
+    "дима": ("дмитрий",), "митя": ("дмитрий",),
+    "ваня": ("иван",),
+    "ильюша": ("илья",),
+    "костя": ("константин",),
+    "лёня": ("леонид",), "леня": ("леонид",),
+    "макс": ("максим",),
+    "миша": ("михаил",),
+    "коля": ("николай",),
+    "паша": ("павел",),
+    "петя": ("петр",),
+    "рома": ("роман",),
+    "серёжа": ("сергей",),
+    "стёпа": ("степан",), "степа": ("степан",),
+    "федя": ("федор",),
+    "эдик": ("эдуард",),
+    "юра": ("юрий",),
+    "яша": ("яков",),
+
+    # Универсальные имена (могут быть и мужскими и женскими)
+    "женя": ("евгений", "евгения"),
+    "саша": ("александр", "александра"),
+    "валя": ("валентина", "валентин"),
+    "валера": ("валерий", "валерия"),
+}
+
+
+def _match_words(text: str, query_words: Tuple[str, ...]) -> bool:
+    """
+    Проверяет, есть ли запрос в строке text (уже нормализованной):
+    - одно слово — как подстрока
+    - два и больше — первые два слова подряд в любом порядке
+    """
+    if not text:
+        return False
+
+    if len(query_words) == 1:
+        return query_words[0] in text
+
+    if len(query_words) >= 2:
+        w1, w2 = query_words[0], query_words[1]
+        # Сначала дешёвая проверка без сборки строк — большинство строк отсекается здесь
+        if w1 not in text or w2 not in text:
+            return False
+        return f"{w1} {w2}" in text or f"{w2} {w1}" in text
+
+    return False
+
+
 async def give_employee_data(search_type: str, search_query: str, employees: List[Dict],
-                             selected_segment: str = None) -> List[Dict]:
+                             selected_segment: str = None, index: DirectoryIndex = None) -> List[Dict]:
+    """
+    Ищет сотрудников в справочнике, параметры — как у _search_employees_sync.
+    Перебор выполняется в отдельном потоке, чтобы не блокировать event loop на больших таблицах.
+    """
+    if not employees:
+        return []
+    return await asyncio.to_thread(_search_employees_sync, search_type, search_query, employees,
+                                   selected_segment, index)
+
+
+def _search_employees_sync(search_type: str, search_query: str, employees: List[Dict],
+                           selected_segment: str = None, index: DirectoryIndex = None) -> List[Dict]:
     """
     Ищет сотрудников в данных справочника по строке search_query в списке employees.
     На вход нужно передать тип поиска:
     - По ФИО: "FIO" (также ищет по локации, если по ФИО не найдено)
     - По отделу: "Department"
     - selected_segment: "mavis", "votonia", "both" или None (если не фильтровать)
+    - index: индекс из load_directory для этих же employees, сужает перебор при поиске по ФИО
     Возвращает список с данными найденных сотрудников.
     """
-    nickname_map = {
-        # Женские имена
-        "настя": ["анастасия"], "настюша": ["анастасия"],
-        "геля": ["ангелина"],
-        "лика": ["анжелика"],
-        "аня": ["анна"],
-        "тоня": ["антонина", "тоня"],
-        "лера": ["валерия"],
-        "вика": ["виктория"],
-        "галя": ["галина"],
-        "даша": ["дарья"],
-        "катя": ["екатерина", "катерина"], "катюша": ["екатерина", "катерина"],
-        "лена": ["елена"],
-        "лиза": ["елизавета"],
-        "зина": ["зинаида"],
-        "ира": ["ирина"],
-        "ксюша": ["ксения"],
-        "лида": ["лидия"],
-        "лиля": ["лилия"],
-        "люба": ["любовь"],
-        "люда": ["людмила"],
-        "марго": ["маргарита"],
-        "мариша": ["марина"],
-        "маша": ["мария", "марья"],
-        "надя": ["надежда"],
-        "наташа": ["наталья", "наталия"],
-        "леся": ["олеся"],
-        "оля": ["ольга"],
-        "поля": ["полина"],
-        "рая": ["раиса"],
-        "света": ["светлана"],
-        "соня": ["софия", "софья"],
-        "тая": ["таисия"],
-        "тома": ["тамара"],
-        "таня": ["татьяна"],
-        "уля": ["ульяна"],
-        "юля": ["юлия"],
-
-        # Мужские имена
-        "лёша": ["алексей"], "алёша": ["алексей"], "леша": ["алексей"],
-        "толя": ["анатолий"],
-        "аркаша": ["аркадий"],
-        "тема": ["артем"],
-        "боря": ["борис"],
-        "вадик": ["вадим"],
-        "вася": ["василий"],
-        "витя": ["виктор"],
-        "виталик": ["виталий"],
-        "володя": ["владимир"], "вова": ["владимир"],
-        "влад": ["владислав"],
-        "гена": ["геннадий"],
-        "гоша": ["георгий"], "жора": ["георгий"],
-        "гриша": ["григорий"],
-        "даня": ["даниил"],
-        "ден": ["денис"],
-        "дима": ["дмитрий"], "митя": ["дмитрий"],
-        "ваня": ["иван"],
-        "ильюша": ["илья"],
-        "костя": ["константин"],
-        "лёня": ["леонид"], "леня": ["леонид"],
-        "макс": ["максим"],
-        "миша": ["михаил"],
-        "коля": ["николай"],
-        "паша": ["павел"],
-        "петя": ["петр"],
-        "рома": ["роман"],
-        "серёжа": ["сергей"],
-        "стёпа": ["степан"], "степа": ["степан"],
-        "федя": ["федор"],
-        "эдик": ["эдуард"],
-        "юра": ["юрий"],
-        "яша": ["яков"],
-
-        # Универсальные имена (могут быть и мужскими и женскими)
-        "женя": ["евгений", "евгения"],
-        "саша": ["александр", "александра"],
-        "валя": ["валентина", "валентин"],
-        "валера": ["валерий", "валерия"],
-    }
-
     results = []
     if not employees:
         return results
 
-    # Нормализуем запрос
-    query = search_query.strip().lower()
-    query_words = re.split(r"\s+", query)
+    query_words = _query_words(search_query)
 
     # Нормализация: каждое слово из запроса заменяем на все возможные варианты из словаря
     normalized_query_variants = []
     was_normalized = []  # Флаг, было ли слово нормализовано
     for word in query_words:
-        if word in nickname_map:
-            normalized_query_variants.append(nickname_map[word])
+        if word in NICKNAME_MAP:
+            normalized_query_variants.append(NICKNAME_MAP[word])
             was_normalized.append(True)
         else:
-            normalized_query_variants.append([word])
+            normalized_query_variants.append((word,))
             was_normalized.append(False)
 
-    for emp in employees:
-        # Проверяем сегмент, если указан
-        if selected_segment and selected_segment != "both":
-            company_segment = emp.get('Company_segment')
-            if not company_segment:
-                continue
-
-            # Определяем, подходит ли сотрудник под выбранный сегмент
-            segment_allowed = False
-
-            if selected_segment == "mavis":
-                if company_segment in ["МАВИС", "ОБА"]:
-                    segment_allowed = True
-            elif selected_segment == "votonia":
-                if company_segment in ["ВОТОНЯ", "ОБА"]:
-                    segment_allowed = True
+    # Варианты полного имени для однословного запроса по уменьшительному имени
+    first_name_variants = frozenset(normalized_query_variants[0]) if normalized_query_variants else frozenset()
+
+    # Маска выбранного сегмента, None — не фильтруем
+    allowed_mask = None
+    if selected_segment and selected_segment != "both":
+        allowed_mask = _SEGMENT_FILTERS.get(selected_segment, 0)
+
+    prepare_employees(employees)
+
+    # Если есть индекс — перебираем только строки-кандидаты, порядок сохраняем
+    if index is not None and search_type == "FIO":
+        candidate_ids = _fio_candidates(index, query_words, normalized_query_variants, was_normalized)
+        if candidate_ids is not None:
+            if not candidate_ids:
+                logger.debug(f"По запросу '{mask_pii(search_query)}' нет кандидатов в индексе")
+                return results
+            employees = [employees[i] for i in sorted(candidate_ids)]
+
+    # Режим сравнения не зависит от строки — выбираем его один раз до цикла
+    is_fio_search = search_type == "FIO"
+    single_word = len(query_words) == 1
+    single_nickname = single_word and was_normalized[0]
+
+    # Для двух слов — все комбинации вариантов в любом порядке (фамилия имя или имя фамилия)
+    name_pairs: Tuple[str, ...] = ()
+    if len(normalized_query_variants) >= 2:
+        name_pairs = tuple(dict.fromkeys(
+            pair
+            for w1 in normalized_query_variants[0]
+            for w2 in normalized_query_variants[1]
+            for pair in (f"{w1} {w2}", f"{w2} {w1}")
+        ))
 
-            if not segment_allowed:
-                continue
+    for emp in employees:
+        # Сначала самые дешёвые проверки: сегмент по маске
+        if allowed_mask is not None and not emp["_seg_mask"] & allowed_mask:
+            continue
 
         # Проверяем поле для поиска
-        if search_type == "FIO":
+        if is_fio_search:
             # Ищем по ФИО
-            name_field = emp.get("FIO", "")
-            if name_field:
-                # Разбиваем ФИО на части и берем первые два слова (фамилия и имя)
-                name_parts = name_field.lower().split()
-                if len(name_parts) >= 2:
-                    # Берем фамилию и имя (первые два слова)
-                    name_to_search = f"{name_parts[0]} {name_parts[1]}"
-                    first_name = name_parts[1]  # Имя (второе слово)
-                else:
-                    # Если вдруг только одно слово, используем его
-                    name_to_search = name_parts[0] if name_parts else ""
-                    first_name = name_parts[0] if name_parts else ""
-
+            name_to_search = emp["_fio_lc"]
+            if name_to_search:
                 found = False
 
-                # Если одно слово в запросе
-                if len(normalized_query_variants) == 1:
-                    # Перебираем все варианты нормализованного слова
-                    for w1 in normalized_query_variants[0]:
-                        if was_normalized[0]:
-                            # Если слово было нормализовано, ищем только в имени
-                            if w1 == first_name:
-                                found = True
-                                break
-                        else:
-                            # Если не нормализовано, ищем подстроку во всей строке фамилия+имя
-                            if w1 in name_to_search:
-                                found = True
-                                break
-
-                # Если два слова в запросе
-                elif len(normalized_query_variants) >= 2:
-                    # Перебираем все комбинации
-                    for w1 in normalized_query_variants[0]:
-                        for w2 in normalized_query_variants[1]:
-                            # Проверяем совпадение в любом порядке (фамилия имя или имя фамилия)
-                            if f"{w1} {w2}" in name_to_search or f"{w2} {w1}" in name_to_search:
-                                found = True
-                                break
-                        if found:
-                            break
+                if single_nickname:
+                    # Слово было нормализовано — ищем только в имени, сразу по всем вариантам
+                    found = emp["_first_name_lc"] in first_name_variants
+                elif single_word:
+                    # Не нормализовано — ищем подстроку во всей строке фамилия+имя
+                    found = query_words[0] in name_to_search
+                elif name_pairs:
+                    # Два слова в запросе: ищем любую из заранее собранных пар
+                    found = any(pair in name_to_search for pair in name_pairs)
 
                 if found:
                     results.append(emp)
                     continue  # Если нашли по ФИО, не ищем по локации
 
             # Если не нашли по ФИО, ищем по локации (без нормализации)
-            location = emp.get("Location", "")
-            if location:
-                location_lower = location.lower()
-                if len(query_words) == 1:
-                    if query_words[0] in location_lower:
-                        results.append(emp)
-                elif len(query_words) >= 2:
-                    w1, w2 = query_words[0], query_words[1]
-                    if f"{w1} {w2}" in location_lower or f"{w2} {w1}" in location_lower:
-                        results.append(emp)
+            if _match_words(emp["_loc_lc"], query_words):
+                results.append(emp)
 
         else:  # Поиск по отделу
-            dept_field = emp.get("Department", "")
-            if not dept_field:
-                continue
-
-            dept_lower = dept_field.lower()
-
-            # --- Одинарный запрос
-            if len(query_words) == 1:
-                if query_words[0] in dept_lower:
-                    results.append(emp)
-
-            # --- Два слова
-            elif len(query_words) >= 2:
-                w1, w2 = query_words[0], query_words[1]
-                if f"{w1} {w2}" in dept_lower or f"{w2} {w1}" in dept_lower:
-                    results.append(emp)
+            if _match_words(emp["_dept_lc"], query_words):
+                results.append(emp)
 
     logger.debug(f"По запросу '{mask_pii(search_query)}' (сегмент: {selected_segment}) найдено {len(results)} сотрудник(ов)")
     return results
@@ -305,44 +448,44 @@ async def format_ats_internal(searched_employees_raw: List[Dict]) -> List[Dict]:
     return result
 
 
+# Поля карточки сотрудника в порядке вывода: (ключ записи, шаблон строки).
+# "Emails" — собранная строка почт, Prefix и Number_direct выводятся только при наличии внутреннего номера
+_EMPLOYEE_ROWS: Tuple[Tuple[str, str], ...] = (
+    ("FIO", "<b>{}</b>"),
+    ("Emails", "Email: {}"),
+    ("Internal_number", "Внутренний телефон: {}"),
+    ("Prefix", "Префикс: {}"),
+    ("Number_direct", "Городской номер: {}"),
+    ("Mobile_public", "Мобильный телефон: {}"),
+    ("Location", "Рабочее место: {}"),
+    ("Positions", "Должность: {}"),
+    ("Departments", "Отдел: {}"),
+)
+_EMAIL_ROWS: Tuple[Tuple[str, str], ...] = (
+    ("Email_mavis", "{} "),
+    ("Email_votonia", "{} "),
+    ("Email_other", "{}"),
+)
+_INTERNAL_ONLY_FIELDS = frozenset({"Prefix", "Number_direct"})
+
+
 async def format_employee_text(emp: Dict) -> str:
     """
     Форматирует данные одного сотрудника в текст.
     """
-    parts = []
-
-    if emp.get("FIO"):
-        parts.append(f"<b>{emp['FIO']}</b>")
-
-    emails = []
-    if emp.get("Email_mavis"):
-        emails.append(f"{emp['Email_mavis']} ")
-    if emp.get("Email_votonia"):
-        emails.append(f"{emp['Email_votonia']} ")
-    if emp.get("Email_other"):
-        emails.append(f"{emp['Email_other']}")
+    emails = ", ".join(template.format(value) for key, template in _EMAIL_ROWS if (value := emp.get(key)))
+    has_internal = bool(emp.get("Internal_number"))
 
-    if emails:
-        parts.append(f"Email: {', '.join(emails)}")
-
-    if emp.get("Internal_number"):
-        parts.append(f"Внутренний телефон: {emp['Internal_number']}")
-        if emp.get("Prefix"):
-            parts.append(f"Префикс: {emp['Prefix']}")
-        if emp.get("Number_direct"):
-            parts.append(f"Городской номер: {emp['Number_direct']}")
-
-    if emp.get("Mobile_public"):
-        parts.append(f"Мобильный телефон: {emp['Mobile_public']}")
-
-    if emp.get("Location"):
-        parts.append(f"Рабочее место: {emp['Location']}")
-
-    if emp.get("Positions"):
-        parts.append(f"Должность: {emp['Positions']}")
-
-    if emp.get("Departments"):
-        parts.append(f"Отдел: {emp['Departments']}")
+    parts = []
+    for key, template in _EMPLOYEE_ROWS:
+        if key == "Emails":
+            value = emails
+        elif key in _INTERNAL_ONLY_FIELDS and not has_internal:
+            continue
+        else:
+            value = emp.get(key)
+        if value:
+            parts.append(template.format(value))
 
     return "\n".join(parts)
 
@@ -353,9 +496,7 @@ async def give_unit_data(search_query: str, unit_data: List[Dict]) -> List[Dict]
     if not unit_data:
         return results
 
-    # Нормализуем запрос
-    query = search_query.strip().lower()
-    query_words = re.split(r"\s+", query)
+    query_words = _query_words(search_query)
 
     for unit in unit_data:
         # Берём название подразделения, если оно есть
@@ -363,18 +504,10 @@ async def give_unit_data(search_query: str, unit_data: List[Dict]) -> List[Dict]
         if not title_field:
             continue
 
-        title_norm = title_field.lower()
-
-        # --- Одинарный запрос (одна подстрока)
-        if len(query_words) == 1:
-            if query_words[0] in title_norm:
-                results.append(unit)
+        title_norm = _fold(title_field)
 
-        # --- Две и больше подстроки
-        elif len(query_words) >= 2:
-            w1, w2 = query_words[0], query_words[1]
-            if f"{w1} {w2}" in title_norm or f"{w2} {w1}" in title_norm:
-                results.append(unit)
+        if _match_words(title_norm, query_words):
+            results.append(unit)
 
     logger.debug(f"По запросу '{mask_pii(search_query)}' найдено {len(results)} сотрудник(ов)")
     return results
@@ -0,0 +1,71 @@
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, FrozenSet, List, Optional, Set
+
+
+logger = logging.getLogger(__name__)
+
+_EMPTY: FrozenSet[int] = frozenset()
+
+
+def _trigrams(text: str) -> Set[str]:
+    """Возвращает множество триграмм строки"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class DirectoryIndex:
+    """
+    Индекс по справочнику для быстрого отбора кандидатов при поиске.
+    Строится один раз на снимок таблицы: для каждого поля хранит
+    слово -> номера строк и триграмма -> номера строк.
+    Индекс только сужает перебор, точная проверка совпадения остаётся за вызывающим кодом.
+    """
+
+    def __init__(self, records: List[Dict], fields: Dict[str, Callable[[Dict], str]]):
+        self.records = records
+        self.token_map: Dict[str, Dict[str, Set[int]]] = {}
+        self.trigram_map: Dict[str, Dict[str, Set[int]]] = {}
+
+        for field, get_text in fields.items():
+            token_map = defaultdict(set)
+            trigram_map = defaultdict(set)
+
+            for i, record in enumerate(records):
+                text = get_text(record)
+                if not text:
+                    continue
+                for token in text.split():
+                    token_map[token].add(i)
+                for trigram in _trigrams(text):
+                    trigram_map[trigram].add(i)
+
+            self.token_map[field] = dict(token_map)
+            self.trigram_map[field] = dict(trigram_map)
+
+        logger.debug(f"Построен индекс справочника: {len(records)} записей, поля: {', '.join(fields)}")
+
+    def by_token(self, field: str, token: str) -> Set[int]:
+        """Номера строк, в поле field которых есть слово token целиком"""
+        return self.token_map[field].get(token, set())
+
+    def by_substring(self, field: str, word: str) -> Optional[Set[int]]:
+        """
+        Номера строк, в поле field которых могут встретиться все триграммы word.
+        Для слов короче трёх символов индекс не помогает — возвращает None (проверять все строки).
+        """
+        trigrams = _trigrams(word)
+        if not trigrams:
+            return None
+
+        trigram_map = self.trigram_map[field]
+        postings = []
+        for trigram in trigrams:
+            rows = trigram_map.get(trigram)
+            if rows is None:
+                # Такой триграммы нет ни в одной строке — совпадений точно нет
+                return _EMPTY
+            postings.append(rows)
+
+        # Пересекаем начиная с самого короткого списка, одним вызовом set.intersection
+        postings.sort(key=len)
+        return postings[0].intersection(*postings[1:])
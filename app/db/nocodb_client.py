@@ -1,46 +1,98 @@
+import asyncio
 import aiohttp
 import logging
-from typing import Any, Dict, List, Optional, Union
+import orjson
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Сколько страниц одной таблицы запрашивается одновременно
+PAGE_FETCH_CONCURRENCY = 8
+
+# Заголовок для тел, уже сериализованных в байты: иначе aiohttp пометит их как octet-stream
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Статусы, при которых пачка отклонена из-за данных: только их имеет смысл повторять построчно
+_ROW_RETRY_STATUSES = frozenset({400, 422})
+
+# Общий таймаут одного запроса к NocoDB, чтобы зависший ответ не держал соединение пула
+_REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=30)
+
+
+class NocoDBHTTPError(Exception):
+    """Ошибка ответа NocoDB: хранит HTTP-статус и текст ответа."""
+
+    __slots__ = ("status", "body")
+
+    def __init__(self, status: int, body: str):
+        super().__init__(f"NocoDB API error {status}: {body}")
+        self.status = status
+        self.body = body
+
 
 class NocoDBClient:
+    __slots__ = ("base_url", "headers", "session", "_url_cache")
+
     def __init__(self):
-        self.base_url = Config.NOCOBD_SERVER.rstrip('/')
+        self.base_url = (Config.NOCOBD_SERVER or "").rstrip('/')
         self.headers = {
             "xc-token": Config.NOCOBD_API_TOKEN,
             "Content-Type": "application/json"
         }
         self.session: Optional[aiohttp.ClientSession] = None
+        # table_id -> URL эндпоинта записей, чтобы не собирать строку на каждый запрос
+        self._url_cache: Dict[str, str] = {}
 
-    async def _ensure_session(self):
+    async def start(self):
+        """Открывает сессию. Вызывается один раз: через async with или явно для общего клиента"""
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession(headers=self.headers)
+            # Пул соединений с keep-alive: повторные запросы не платят за TCP/TLS-рукопожатие.
+            # Все запросы идут на один хост NocoDB, поэтому ограничиваем только limit_per_host
+            connector = aiohttp.TCPConnector(limit=0, limit_per_host=Config.NOCODB_POOL_SIZE,
+                                             ttl_dns_cache=600, keepalive_timeout=75)
+            self.session = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=connector,
+                timeout=_REQUEST_TIMEOUT
+            )
+
+    def _records_url(self, table_id: str) -> str:
+        url = self._url_cache.get(table_id)
+        if url is None:
+            url = self._url_cache[table_id] = f"{self.base_url}/api/v2/tables/{table_id}/records"
+        return url
 
     async def close(self):
         if self.session and not self.session.closed:
             await self.session.close()
 
     async def _make_request(self, method: str, url: str, **kwargs) -> Any:
-        await self._ensure_session()
+        if self.session is None or self.session.closed:
+            # Для общего nocodb_client это значит, что бот ещё не запущен или уже остановлен
+            raise RuntimeError("NocoDBClient не открыт или уже закрыт: используйте async with или start()")
+        # Тело сериализуем сразу в байты через orjson, минуя json-обработку aiohttp
+        if "json" in kwargs:
+            kwargs["data"] = orjson.dumps(kwargs.pop("json"))
+            kwargs["headers"] = _JSON_HEADERS
         try:
             async with self.session.request(method, url, **kwargs) as response:
                 if response.status >= 400:
                     error_text = await response.text()
-                    logger.error(f"NocoDB API error {response.status}: {error_text}")
-                    raise Exception(f"NocoDB API error {response.status}: {error_text}")
-                return await response.json()
+                    logger.error("NocoDB API error %s: %s", response.status, error_text)
+                    raise NocoDBHTTPError(response.status, error_text)
+                body = await response.read()
+                # Пустое тело — как в response.json(), возвращаем None
+                return orjson.loads(body) if body.strip() else None
         except aiohttp.ClientError as e:
-            logger.error(f"Request failed: {e}")
+            logger.error("Request failed: %s", e)
             raise Exception(f"Request failed: {e}")
 
     async def get_all(self, table_id: str, fields: Optional[List[str]] = None, where: Optional[str] = None,
                       sort: Optional[str] = None, limit: int = 100, offset: int = 0) -> List[Dict]:
         """Получить все записи таблицы"""
-        logger.debug(f"Getting records from table {table_id}")
-        url = f"{self.base_url}/api/v2/tables/{table_id}/records"
+        logger.debug("Getting records from table %s", table_id)
+        url = self._records_url(table_id)
 
         params = {"limit": limit, "offset": offset}
         if fields:
@@ -50,47 +102,75 @@ class NocoDBClient:
         if sort:
             params["sort"] = sort
 
+        # Первая страница сообщает общее число строк, остальные запрашиваем параллельно
         response = await self._make_request("GET", url, params=params)
         records = response.get("list", [])
         page_info = response.get("pageInfo", {})
 
         if not page_info.get("isLastPage", True):
             total_rows = page_info.get("totalRows", 0)
-            if offset + limit < total_rows:
-                next_records = await self.get_all(
-                    table_id=table_id,
-                    fields=fields,
-                    where=where,
-                    sort=sort,
-                    limit=limit,
-                    offset=offset + limit
-                )
-                records.extend(next_records)
-
-        logger.debug(f"Retrieved {len(records)} records from table {table_id}")
+            semaphore = asyncio.Semaphore(PAGE_FETCH_CONCURRENCY)
+
+            async def fetch_page(page_offset: int) -> List[Dict]:
+                async with semaphore:
+                    page = await self._make_request("GET", url, params={**params, "offset": page_offset})
+                return page.get("list", [])
+
+            pages = await asyncio.gather(
+                *(fetch_page(page_offset) for page_offset in range(offset + limit, total_rows, limit))
+            )
+            for page in pages:
+                records.extend(page)
+
+        logger.debug("Retrieved %s records from table %s", len(records), table_id)
         return records
 
+    async def iter_all(self, table_id: str, fields: Optional[List[str]] = None, where: Optional[str] = None,
+                       sort: Optional[str] = None, limit: int = 1000) -> AsyncIterator[List[Dict]]:
+        """Получать записи таблицы постранично, не накапливая всю таблицу в памяти"""
+        url = self._records_url(table_id)
+        offset = 0
+
+        while True:
+            params = {"limit": limit, "offset": offset}
+            if fields:
+                params["fields"] = ",".join(fields)
+            if where:
+                params["where"] = where
+            if sort:
+                params["sort"] = sort
+
+            response = await self._make_request("GET", url, params=params)
+            records = response.get("list", [])
+            if records:
+                yield records
+
+            page_info = response.get("pageInfo", {})
+            if page_info.get("isLastPage", True) or not records:
+                break
+            offset += limit
+
     async def get_record(self, table_id: str, record_id: Union[int, str], fields: Optional[List[str]] = None) -> \
     Optional[Dict]:
         """Получить одну запись по ID"""
-        logger.debug(f"Getting record {record_id} from table {table_id}")
-        url = f"{self.base_url}/api/v2/tables/{table_id}/records/{record_id}"
+        logger.debug("Getting record %s from table %s", record_id, table_id)
+        url = f"{self._records_url(table_id)}/{record_id}"
         params = {}
         if fields:
             params["fields"] = ",".join(fields)
 
         try:
             return await self._make_request("GET", url, params=params)
-        except Exception as e:
-            if "404" in str(e):
-                logger.warning(f"Record {record_id} not found in table {table_id}")
+        except NocoDBHTTPError as e:
+            if e.status == 404:
+                logger.warning("Record %s not found in table %s", record_id, table_id)
                 return None
             raise
 
     async def create_record(self, table_id: str, data: Dict[str, Any]) -> List[Dict]:
         """Создать новую запись в таблице"""
-        logger.debug(f"Creating record in table {table_id}")
-        url = f"{self.base_url}/api/v2/tables/{table_id}/records"
+        logger.debug("Creating record in table %s", table_id)
+        url = self._records_url(table_id)
         # NocoDB ожидает массив записей для создания
         payload = [data]
         response = await self._make_request("POST", url, json=payload)
@@ -99,36 +179,102 @@ class NocoDBClient:
 
     async def update_record(self, table_id: str, record_id: Union[int, str], data: Dict[str, Any]) -> Dict:
         """Изменить существующую запись"""
-        logger.debug(f"Updating record {record_id} in table {table_id}")
-        url = f"{self.base_url}/api/v2/tables/{table_id}/records"
+        logger.debug("Updating record %s in table %s", record_id, table_id)
+        url = self._records_url(table_id)
         payload = [{**data, "Id": record_id}]
         response = await self._make_request("PATCH", url, json=payload)
 
         if isinstance(response, list) and len(response) > 0:
-            logger.debug(f"Record {record_id} updated successfully")
+            logger.debug("Record %s updated successfully", record_id)
             return response[0]
-        logger.debug(f"Record {record_id} updated")
+        logger.debug("Record %s updated", record_id)
         return response
 
+    async def _send_in_chunks(self, method: str, table_id: str, rows: List[Dict[str, Any]],
+                              chunk_size: int) -> List[Dict]:
+        """
+        Отправляет строки в /records пачками по chunk_size.
+        Ошибка одной пачки не останавливает остальные. Пачку, отклонённую NocoDB как невалидную (400/422),
+        повторяем построчно, чтобы одна плохая строка стоила только себя. При перегрузке (5xx, 429)
+        и сетевых ошибках пачку не повторяем, чтобы не умножать нагрузку. Возвращает ответы NocoDB по записанным строкам
+        """
+        url = self._records_url(table_id)
+        done = []
+        failed = 0
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            try:
+                response = await self._make_request(method, url, json=chunk)
+            except NocoDBHTTPError as e:
+                if e.status not in _ROW_RETRY_STATUSES:
+                    # Сервер перегружен или ограничивает частоту — построчный повтор только усилит нагрузку
+                    failed += len(chunk)
+                    logger.error("Bulk %s of %s rows in table %s failed: %s", method, len(chunk), table_id, e)
+                    continue
+                # NocoDB отклонил данные пачки — вероятно, из-за отдельных строк, поэтому повторяем построчно
+                logger.warning("Bulk %s of %s rows in table %s failed, retrying row by row: %s",
+                               method, len(chunk), table_id, e)
+                for row in chunk:
+                    try:
+                        response = await self._make_request(method, url, json=[row])
+                    except Exception as row_error:
+                        failed += 1
+                        logger.error("%s of row %s in table %s failed: %s",
+                                     method, row.get("Id", "<new>"), table_id, row_error)
+                        continue
+                    if isinstance(response, list):
+                        done.extend(response)
+                continue
+            except Exception as e:
+                # Сетевая ошибка не говорит о плохих строках: пачку считаем несохранённой и идём дальше
+                failed += len(chunk)
+                logger.error("Bulk %s of %s rows in table %s failed: %s", method, len(chunk), table_id, e)
+                continue
+            if isinstance(response, list):
+                done.extend(response)
+
+        if failed:
+            logger.error("Bulk %s in table %s: %s of %s rows failed", method, table_id, failed, len(rows))
+        return done
+
+    async def create_records(self, table_id: str, rows: List[Dict[str, Any]], chunk_size: int = 100) -> List[Dict]:
+        """Создать несколько записей пачками по chunk_size. Возвращает созданные записи с их Id"""
+        logger.debug("Creating %s records in table %s", len(rows), table_id)
+        return await self._send_in_chunks("POST", table_id, rows, chunk_size)
+
+    async def update_records(self, table_id: str, rows: List[Dict[str, Any]], chunk_size: int = 100) -> List[Dict]:
+        """
+        Изменить несколько записей: каждая строка должна содержать Id, отправляем пачками по chunk_size.
+        Возвращает обновлённые записи
+        """
+        logger.debug("Updating %s records in table %s", len(rows), table_id)
+        return await self._send_in_chunks("PATCH", table_id, rows, chunk_size)
+
     async def delete_record(self, table_id: str, record_id: Union[int, str]) -> bool:
         """Удалить запись по ID"""
-        logger.debug(f"Deleting record {record_id} from table {table_id}")
-        url = f"{self.base_url}/api/v2/tables/{table_id}/records"
+        logger.debug("Deleting record %s from table %s", record_id, table_id)
+        url = self._records_url(table_id)
         payload = [{"Id": record_id}]
         response = await self._make_request("DELETE", url, json=payload)
 
         if isinstance(response, list) and len(response) > 0:
             deleted = response[0].get("Id") == record_id
             if deleted:
-                logger.debug(f"Record {record_id} deleted successfully")
+                logger.debug("Record %s deleted successfully", record_id)
             return deleted
-        logger.debug(f"Record {record_id} deletion processed")
+        logger.debug("Record %s deletion processed", record_id)
         return False
 
+    async def delete_records(self, table_id: str, record_ids: List[Union[int, str]], chunk_size: int = 100) -> List[Dict]:
+        """Удалить несколько записей по Id пачками по chunk_size. Возвращает удалённые Id"""
+        logger.debug("Deleting %s records from table %s", len(record_ids), table_id)
+        rows = [{"Id": record_id} for record_id in record_ids]
+        return await self._send_in_chunks("DELETE", table_id, rows, chunk_size)
+
     async def create_column(self, table_id: str, column_name: str, column_type: str = "SingleLineText",
                             options: Optional[Dict[str, Any]] = None) -> Dict:
         """Создать новую колонку в таблице"""
-        logger.debug(f"Creating column {column_name} in table {table_id}")
+        logger.debug("Creating column %s in table %s", column_name, table_id)
         column_data = {
             "title": column_name,
             "column_name": column_name.lower().replace(" ", "_"),
@@ -141,9 +287,9 @@ class NocoDBClient:
         url = f"{self.base_url}/api/v2/tables/{table_id}/columns"
         try:
             return await self._make_request("POST", url, json=column_data)
-        except Exception as e:
-            if "404" in str(e):
-                logger.error(f"Column creation endpoint not found for table {table_id}")
+        except NocoDBHTTPError as e:
+            if e.status == 404:
+                logger.error("Column creation endpoint not found for table %s", table_id)
                 raise Exception("Column creation endpoint not found")
             raise
 
@@ -163,8 +309,14 @@ class NocoDBClient:
         return type_mapping.get(column_type, "SingleLineText")
 
     async def __aenter__(self):
-        await self._ensure_session()
+        await self.start()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.close()
+
+
+# Общий клиент бота: сессия и пул соединений открываются при старте (start) и живут до остановки.
+# Все запросы бота идут через него; свой NocoDBClient через async with нужен только отдельным скриптам.
+# Не используйте общий клиент через async with — это закроет сессию для всех
+nocodb_client = NocoDBClient()
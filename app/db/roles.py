@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from datetime import datetime, date, time
 from enum import Enum
@@ -5,9 +6,10 @@ from typing import List, Optional, Dict
 from dateutil.relativedelta import relativedelta
 
 from config import Config
-from app.db.table_data import fetch_table
-from app.db.nocodb_client import NocoDBClient
-from app.db.auth_table_crud import update_auth
+from app.db.table_data import fetch_table, load_table_snapshot
+from app.db.nocodb_client import nocodb_client
+from app.db.auth_table_crud import update_auth_bulk
+from app.services.cache import role_cache, clear_user_auth
 from app.services.utils import mask_pii
 
 logger = logging.getLogger(__name__)
@@ -26,65 +28,73 @@ class RoleChecker:
 
     async def get_role(user_id: str) -> Optional[str]:
         """Получает роль пользователя из NocoDB"""
+        cache_key = str(user_id)
+        if cache_key in role_cache:
+            return role_cache[cache_key]
+
         try:
-            async with NocoDBClient() as client:
-                # Ищем пользователя по ID_messenger
-                where_filter = f"(ID_messenger,eq,{user_id})"
-                users = await client.get_all(
-                    table_id=Config.AUTH_TABLE_ID,
-                    where=where_filter,
-                    limit=1
-                )
+            # Ищем пользователя по ID_messenger
+            where_filter = f"(ID_messenger,eq,{user_id})"
+            users = await nocodb_client.get_all(
+                table_id=Config.AUTH_TABLE_ID,
+                where=where_filter,
+                limit=1
+            )
 
             if not users:
-                logger.warning(f"Пользователь {user_id} не найден в таблице")
+                logger.warning("Пользователь %s не найден в таблице", user_id)
                 return None
 
             user = users[0]
             role = user.get('Role')
-            logger.debug(f"Найден пользователь: {mask_pii(user.get('FIO'))}, его роль: {role}")
+            logger.debug("Найден пользователь: %s, его роль: %s", mask_pii(user.get('FIO')), role)
+            role_cache[cache_key] = role
             return role
 
         except Exception as e:
-            logger.error(f"Ошибка получения роли для {user_id}: {str(e)}", exc_info=True)
+            logger.error("Ошибка получения роли для %s: %s", user_id, e, exc_info=True)
             return None
 
     async def change_user_role(user_id: int, new_role: str) -> bool:
-        """Изменяет роль пользователя в таблице NocoDB"""
-        try:
-            async with NocoDBClient() as client:
-                # Получаем пользователя по ID_messenger
-                where_filter = f"(ID_messenger,eq,{user_id})"
-                users = await client.get_all(
-                    table_id=Config.AUTH_TABLE_ID,
-                    where=where_filter,
-                    limit=1
-                )
+        """
+        Изменяет роль пользователя в таблице NocoDB.
+        Строку ищем по ID_messenger перед каждой записью: синхронизация может пересоздать строки
+        """
+        cache_key = str(user_id)
+        update_data = {"Role": new_role}
 
-                if not users:
-                    logger.error(f"User {user_id} not found")
-                    return False
+        try:
+            # Получаем пользователя по ID_messenger
+            where_filter = f"(ID_messenger,eq,{user_id})"
+            users = await nocodb_client.get_all(
+                table_id=Config.AUTH_TABLE_ID,
+                where=where_filter,
+                limit=1
+            )
 
-                user_row = users[0]
-                record_id = user_row.get('Id')
+            if not users:
+                logger.error("User %s not found", user_id)
+                return False
 
-                if not record_id:
-                    logger.error("User row has no ID")
-                    return False
+            user_row = users[0]
+            record_id = user_row.get('Id')
 
-                update_data = {"Role": new_role}
+            if not record_id:
+                logger.error("User row has no ID")
+                return False
 
-                await client.update_record(
-                    table_id=Config.AUTH_TABLE_ID,
-                    record_id=record_id,
-                    data=update_data
-                )
+            await nocodb_client.update_record(
+                table_id=Config.AUTH_TABLE_ID,
+                record_id=record_id,
+                data=update_data
+            )
 
-                logger.info(f"Role changed to {new_role} for user {user_id}")
-                return True
+            clear_user_auth(cache_key)
+            logger.info("Role changed to %s for user %s", new_role, user_id)
+            return True
 
         except Exception as e:
-            logger.error(f"Error changing role for {user_id}: {str(e)}", exc_info=True)
+            logger.error("Error changing role for %s: %s", user_id, e, exc_info=True)
             return False
 
 
@@ -95,42 +105,57 @@ class RoleChecker:
         logger.info("Начало проверки ролей пользователей")
 
         try:
-            # Получаем всех пользователей с ролью newcomer
-            newcomer_users = await self._get_newcomer_users()
+            # Новичков из таблицы авторизации и сводную таблицу для проверки дат загружаем одновременно
+            newcomer_users, users_pivot = await asyncio.gather(self._get_newcomer_users(), self._get_users())
 
             if not newcomer_users:
                 logger.info("Нет пользователей с ролью newcomer")
                 return
 
-            logger.info(f"Найдено {len(newcomer_users)} пользователей с ролью newcomer")
-
-            # Получаем данные из сводной таблицы для проверки дат
-            users_pivot = await self._get_users()
+            logger.info("Найдено %s пользователей с ролью newcomer", len(newcomer_users))
 
             if not users_pivot:
                 logger.warning("Нет данных для проверки ролей")
                 return
 
-            # Проверяем каждого новичка
-            updated_count = 0
+            # Индекс сводной таблицы по СНИЛС — строим один раз на весь прогон.
+            # При повторе СНИЛС остаётся первая строка, как при прежнем линейном поиске
+            pivot_index = {}
+            for u in users_pivot:
+                if u.get('SNILS'):
+                    pivot_index.setdefault(u['SNILS'], u)
+
+            # Граница «новичка» одна на весь прогон
+            cutoff = datetime.now().date() - relativedelta(months=3)
+
+            # Проверяем каждого новичка, сами обновления отправляем одним пакетом
+            promoted_users = []
             for user in newcomer_users:
                 try:
-                    need_update = await self._check_user_role(user, users_pivot)
-                    if need_update:
-                        update_data = {
-                            'Role': 'employee'
-                        }
-                        success = await update_auth(user.get('Id'), update_data)
-                        updated_count += 1
-                        if success:
-                            logger.info(f"Роль пользователя {mask_pii(user.get('FIO'))} изменилась: employee ")
+                    if await self._check_user_role(user, pivot_index, cutoff):
+                        promoted_users.append(user)
                 except Exception as e:
-                    logger.error(f"Ошибка проверки пользователя {mask_pii(user.get('FIO'))}: {e}")
+                    logger.error("Ошибка проверки пользователя %s: %s", mask_pii(user.get('FIO')), e)
 
-            logger.info(f"Проверка ролей завершена. Обновлено: {updated_count}/{len(newcomer_users)}")
+            updated_count = 0
+            if promoted_users:
+                to_update = [{'Id': user.get('Id'), 'Role': 'employee'} for user in promoted_users]
+                updated_count = await update_auth_bulk(to_update)
+                # Кеш сбрасываем у всех: у незаписанных строк роль в таблице прежняя и перечитается из неё
+                for user in promoted_users:
+                    if user.get('ID_messenger'):
+                        clear_user_auth(str(user['ID_messenger']))
+                if updated_count == len(promoted_users):
+                    for user in promoted_users:
+                        logger.info("Роль пользователя %s изменилась: employee ", mask_pii(user.get('FIO')))
+                else:
+                    logger.warning("Роль employee записана не всем: %s из %s, подробности в логе NocoDB",
+                                   updated_count, len(promoted_users))
+
+            logger.info("Проверка ролей завершена. Обновлено: %s/%s", updated_count, len(newcomer_users))
 
         except Exception as e:
-            logger.error(f"Ошибка при проверке ролей: {e}")
+            logger.error("Ошибка при проверке ролей: %s", e)
 
 
     async def _get_newcomer_users(self) -> List[Dict]:
@@ -152,21 +177,23 @@ class RoleChecker:
             return newcomer_users
 
         except Exception as e:
-            logger.error(f"Ошибка получения пользователей: {e}")
+            logger.error("Ошибка получения пользователей: %s", e)
             return []
 
 
     async def _get_users(self) -> List[Dict]:
         """
-        Получает данные пользователей из сводной таблицы пользователей
+        Получает данные пользователей из сводной таблицы пользователей.
+        Берёт общий снимок таблицы, который держит прогретым start_directory_refresher,
+        поэтому соседние проверки не скачивают таблицу заново. Поисковый индекс не строится.
         """
         try:
-            users = await fetch_table(table_id=Config.PIVOT_TABLE_ID, app='USER')
+            users = await load_table_snapshot(Config.PIVOT_TABLE_ID)
 
             return users if users else []
 
         except Exception as e:
-            logger.error(f"Ошибка получения данных из 1С: {e}")
+            logger.error("Ошибка получения данных из 1С: %s", e)
             return []
 
 
@@ -175,40 +202,37 @@ class RoleChecker:
         if not date_str:
             return None
         try:
-            return datetime.strptime(date_str, '%Y-%m-%d').date()
+            # ISO-дата фиксированной ширины: fromisoformat разбирает её на C без строки формата
+            return date.fromisoformat(date_str[:10])
         except (ValueError, TypeError):
             return None
 
 
-    def _is_still_newcomer(self, employment_date: Optional[date]) -> bool:
+    def _is_still_newcomer(self, employment_date: Optional[date], cutoff: date) -> bool:
         """
-        Проверяет, является ли пользователь еще новичком (< 3 месяцев)
+        Проверяет, является ли пользователь еще новичком (< 3 месяцев).
+        cutoff — дата три месяца назад, считается один раз на прогон
         """
         if not employment_date:
             return True  # Если даты нет, оставляем как есть
 
-        three_months_ago = datetime.now().date() - relativedelta(months=3)
-        return employment_date > three_months_ago
+        return employment_date > cutoff
 
 
-    async def _check_user_role(self, user: Dict, users_1c: List[Dict]) -> bool:
+    async def _check_user_role(self, user: Dict, pivot_index: Dict[str, Dict], cutoff: date) -> bool:
         """
         Проверяет и обновляет роль одного пользователя
         """
         user_snils = user.get('SNILS')
         if not user_snils:
-            logger.warning(f"У пользователя нет СНИЛС: {mask_pii(user.get('FIO'))}")
+            logger.warning("У пользователя нет СНИЛС: %s", mask_pii(user.get('FIO')))
             return False
 
         # Ищем пользователя в сводной таблице
-        user_1c = None
-        for u in users_1c:
-            if u.get('SNILS') == user_snils:
-                user_1c = u
-                break
+        user_1c = pivot_index.get(user_snils)
 
         if not user_1c:
-            logger.warning(f"Пользователь не найден в сводной таблице: {mask_pii(user.get('FIO'))} ({mask_pii(user_snils)})")
+            logger.warning("Пользователь не найден в сводной таблице: %s (%s)", mask_pii(user.get('FIO')), mask_pii(user_snils))
             return False
 
         # Получаем дату устройства из сводной таблицы пользователей
@@ -216,7 +240,7 @@ class RoleChecker:
         employment_date = self._parse_date(employment_date_str)
 
         # Проверяем, является ли еще новичком
-        is_still_newcomer = self._is_still_newcomer(employment_date)
+        is_still_newcomer = self._is_still_newcomer(employment_date, cutoff)
 
         if not is_still_newcomer:
             return True
@@ -1,18 +1,19 @@
 import asyncio
+import heapq
 import logging
-import pprint
 import re
-from collections import defaultdict
-from datetime import datetime, time, timedelta
-from typing import List, Dict, Iterable, Callable, Awaitable
+from bisect import bisect_right
+from datetime import date, datetime, time, timedelta
+from typing import List, Dict, Iterable, Callable, Awaitable, Tuple
 
 from dateutil.relativedelta import relativedelta
 
-from app.db.auth_table_crud import read_auth, create_auth, update_auth, delete_auth
+from app.db.auth_table_crud import read_auth, create_auth_bulk, update_auth_bulk, delete_auth_bulk
 from app.db.roles import check_user_roles_daily, UserRole, roles_check_time
 from app.db.table_data import fetch_table
-from app.services.pulse_creator import PulseTaskCreator
-from app.services.utils import normalize_phones_string, mask_pii
+from app.services.cache import clear_user_auth
+from app.services.pulse_creator import pulse_task_creator
+from app.services.utils import normalize_phones_string, mask_pii, MSK
 from config import Config
 
 logger = logging.getLogger(__name__)
@@ -21,6 +22,12 @@ logger = logging.getLogger(__name__)
 # Время обновления авторизационной таблицы по данным сводной
 sync_auth_times = [time(8, 15), time(8, 30)]
 
+# Нормализованный мобильный номер: +7 и ещё 10 цифр
+_MOBILE_RE = re.compile(r'^\+7\d{10}$')
+
+# Сколько пульс-опросов создаётся одновременно — ограничение нагрузки на NocoDB
+SYNC_CONCURRENCY = 8
+
 
 #__________________________________________________
 #          ПОДГОТОВКА К СИНХРОНИЗАЦИИ
@@ -46,6 +53,125 @@ async def get_pivot_table_users() -> Dict[str, Dict]:
 # __________________________________________________________
 #            СИНХРОНИЗАЦИЯ АВТОРИЗАЦИОННЫХ ДАННЫХ
 
+def _sync_active_user(snils: str, pivot_user: Dict, auth_users: Dict[str, List[Dict]],
+                      three_months_ago: date, seven_days_ago: date) -> Dict:
+    """
+    Готовит изменения таблицы авторизации для одного активного пользователя.
+    Сами записи не отправляет — возвращает {'create': [...], 'update': [...], 'skipped': 0|1, 'pulse': bool,
+    'evict': [...]}, чтобы sync_auth записал их пакетами и уже после этого создал пульс-опросы.
+    evict — ID_messenger обновляемых строк, у которых нужно сбросить кешированную роль
+    three_months_ago и seven_days_ago — границы для роли новичка и пульс-опросов, считаются один раз на прогон
+    """
+    changes = {'create': [], 'update': [], 'skipped': 0, 'pulse': False, 'evict': []}
+
+    try:
+        # Сначала в авторизационной таблице обновляю все данные
+        # Дата устройства
+        date_employment_str = pivot_user.get('Date_employment')
+        date_employment = None
+        if date_employment_str:
+            try:
+                date_employment = date.fromisoformat(date_employment_str)
+            except (ValueError, TypeError) as e:
+                logger.warning(f"Некорректный формат даты устройства: {date_employment_str}, ошибка: {e}")
+
+        # Определяем роль
+        role = UserRole.EMPLOYEE
+        if date_employment:
+            if date_employment > three_months_ago:
+                role = UserRole.NEWCOMER
+
+        fio = pivot_user.get('FIO', '')
+        # Получаем и нормализуем телефоны
+        phones_raw = pivot_user.get('Phones', '')
+
+        # Нормализуем строку и получаем список телефонов
+        all_normalized_phones = normalize_phones_string(phones_raw) if phones_raw else []
+
+        # Фильтруем только мобильные (начинаются с +7 и имеют 11 цифр после +)
+        # Разные записи одного номера нормализуются в одну строку — оставляем каждый номер один раз
+        mobile_phones = list(dict.fromkeys(
+            phone for phone in all_normalized_phones if _MOBILE_RE.match(phone)
+        ))
+
+        if not mobile_phones:
+            logger.debug(f"Пропускаем {mask_pii(fio)} (СНИЛС: {mask_pii(snils)}) - нет мобильных телефонов")
+            changes['skipped'] = 1
+            return changes
+
+        # Общая часть новых записей пользователя, по телефонам отличается только Phone
+        base_record = {
+            'SNILS': snils,
+            'FIO': fio,
+            'Role': role.value,
+            'ID_messenger': ''
+        }
+
+        if snils not in auth_users:
+            # Пользователь еще отсутствует в авторизационной таблице - создаем записи по каждому МОБИЛЬНОМУ телефону
+            for phone in mobile_phones:
+                logger.debug(f"Создание записи: телефон={mask_pii(phone)}, роль={role.value}")
+                changes['create'].append({**base_record, 'Phone': phone})
+            logger.info(f"Будут созданы {len(mobile_phones)} записи(ей) для {mask_pii(fio)}")
+        else:
+            logger.debug(f"Существующий пользователь {mask_pii(fio)} (СНИЛС: {mask_pii(snils)}) - проверяем обновления")
+            existing_records = auth_users[snils]
+
+            # Один проход по записям: собираем телефоны и записи, где нужно обновить FIO и роль
+            records_to_update = []
+            existing_phones = set()
+            for record in existing_records:
+                existing_phones.add(record.get('Phone', ''))
+                if record.get('FIO') != fio or record.get('Role') != role.value:
+                    records_to_update.append(record)
+
+            if records_to_update:
+                logger.info(f"Обновляем {len(records_to_update)} записи(ей) для {mask_pii(fio)}")
+                for record in records_to_update:
+                    logger.debug(
+                        f"Обновление записи FIO={mask_pii(record.get('FIO'))}→{mask_pii(fio)}, Role={record.get('Role')}→{role.value}")
+                    changes['update'].append({'Id': record['Id'], 'FIO': fio, 'Role': role.value})
+                    if record.get('ID_messenger'):
+                        changes['evict'].append(record['ID_messenger'])
+            else:
+                logger.debug(f"Не требуется обновление")
+
+            # Добавляем новые мобильные телефоны
+            new_phones = [phone for phone in mobile_phones if phone and phone not in existing_phones]
+            if new_phones:
+                logger.info(f"Добавляем {len(new_phones)} новых телефонов для {mask_pii(fio)}")
+                for phone in new_phones:
+                    logger.debug(f"Создание новой записи с телефоном: {mask_pii(phone)}")
+                    changes['create'].append({**base_record, 'Phone': phone})
+
+        # Новым сотрудникам нужны пульс-опросы: создаются после записи таблицы авторизации
+        if date_employment:
+            if date_employment > seven_days_ago:
+                changes['pulse'] = True
+
+    except Exception as e:
+        logger.error(
+            f"Ошибка обработки пользователя {mask_pii(snils)} ({mask_pii(pivot_user.get('FIO', 'нет ФИО'))}): {e}",
+            exc_info=True)
+
+    return changes
+
+
+async def _create_pulse_tasks(pivot_user: Dict, semaphore: asyncio.Semaphore):
+    """Создаёт пульс-опросы для нового сотрудника, ограничивая число одновременных запросов к NocoDB"""
+    fio = mask_pii(pivot_user.get('FIO'))
+    logger.info(f"Работает меньше недели - создаём пульс-опросы для {fio}")
+    try:
+        async with semaphore:
+            created = await pulse_task_creator.create_tasks(pivot_user)
+        if created:
+            logger.info(f"Созданы пульс-опросы для {fio}")
+        else:
+            logger.debug(f"Пульс-опросы не требуются для {fio}")
+    except Exception as e:
+        logger.error(f"Ошибка создания пульс-опросов для {fio}: {e}", exc_info=True)
+
+
 async def sync_auth():
     """
     Синхронизация таблицы авторизации на основе данных из сводной таблицы.
@@ -54,161 +180,67 @@ async def sync_auth():
     logger.info("Начало синхронизации таблицы авторизации")
 
     try:
-        pivot_users = await get_pivot_table_users()
+        # Сводная и авторизационная таблицы независимы — загружаем их одновременно
+        pivot_users, auth_users = await asyncio.gather(get_pivot_table_users(), read_auth())
         logger.info(f"Получено {len(pivot_users)} пользователей из сводной таблицы")
+        logger.info(f"В авторизационной таблице найдено {len(auth_users)} пользователей")
 
         # Фильтруем активных и архивных пользователей отдельно
         active_pivot_users = {}
         archived_pivot_users = {}
 
         for snils, user_data in pivot_users.items():
-            # Если ключа 'Is_archived' нет - значит пользователь активный
-            if 'Is_archived' not in user_data:
-                active_pivot_users[snils] = user_data
-            # Если ключ есть и он True - пользователь архивный
-            elif user_data.get('Is_archived') is True:
+            # Архивный только при Is_archived == True; нет ключа или False — активный
+            if user_data.get('Is_archived') is True:
                 archived_pivot_users[snils] = user_data
-            # Если ключ есть и он False - пользователь активный
             else:
                 active_pivot_users[snils] = user_data
 
         logger.info(f"Найдено активных пользователей: {len(active_pivot_users)}")
         logger.info(f"Найдено архивных пользователей: {len(archived_pivot_users)}")
 
+        # Сравнение с таблицей авторизации не обращается к сети — считаем изменения всех активных подряд
+        today = datetime.now().date()
+        three_months_ago = today - relativedelta(months=3)
+        seven_days_ago = today - timedelta(days=7)
 
-        # Получаем текущих пользователей из авторизационной таблицы
-        auth_users = await read_auth()
-        logger.info(f"В авторизационной таблице найдено {len(auth_users)} пользователей")
-
-        created_count = 0
-        updated_count = 0
+        records_to_create = []
+        records_to_update = []
+        pulse_users = []
+        evict_ids = []
         skipped_count = 0
-
-        # Обрабатываем каждого активного пользователя
         for snils, pivot_user in active_pivot_users.items():
-            try:
-                # Сначала в авторизационной таблице обновляю все данные
-                # Дата устройства
-                date_employment_str = pivot_user.get('Date_employment')
-                date_employment = None
-                if date_employment_str:
-                    try:
-                        date_employment = datetime.strptime(date_employment_str, '%Y-%m-%d').date()
-                    except Exception as e:
-                        logger.warning(f"Некорректный формат даты устройства: {date_employment_str}, ошибка: {e}")
-
-                # Определяем роль
-                role = UserRole.EMPLOYEE
-                if date_employment:
-                    three_months_ago = datetime.now().date() - relativedelta(months=3)
-                    if date_employment > three_months_ago:
-                        role = UserRole.NEWCOMER
-
-                fio = pivot_user.get('FIO', '')
-                # Получаем и нормализуем телефоны
-                phones_raw = pivot_user.get('Phones', '')
-
-                # Нормализуем строку и получаем список телефонов
-                all_normalized_phones = normalize_phones_string(phones_raw) if phones_raw else []
-
-                # Фильтруем только мобильные (начинаются с +7 и имеют 11 цифр после +)
-                mobile_phones = [phone for phone in all_normalized_phones if
-                                 phone.startswith('+7') and len(re.sub(r'\D', '', phone)) == 11]
-
-                if not mobile_phones:
-                    logger.debug(f"Пропускаем {mask_pii(fio)} (СНИЛС: {mask_pii(snils)}) - нет мобильных телефонов")
-                    skipped_count += 1
-                    continue
-
-                if snils not in auth_users:
-                    # Пользователь еще отсутствует в авторизационной таблице - создаем записи по каждому МОБИЛЬНОМУ телефону
-                    for phone in mobile_phones:
-                        auth_record = {
-                            'SNILS': snils,
-                            'FIO': fio,
-                            'Phone': phone,
-                            'Role': role.value,
-                            'ID_messenger': ''
-                        }
-                        logger.debug(f"Создание записи: телефон={mask_pii(phone)}, роль={role.value}")
-                        success = await create_auth(auth_record)
-                        if success:
-                            created_count += 1
-                    logger.info(f"Созданы {len(mobile_phones)} записи(ей) для {mask_pii(fio)}")
-                else:
-                    logger.debug(f"Существующий пользователь {mask_pii(fio)} (СНИЛС: {mask_pii(snils)}) - проверяем обновления")
-                    existing_records = auth_users[snils]
-
-                    # Обновляем FIO и роль во ВСЕХ существующих записях
-                    records_to_update = []
-                    for record in existing_records:
-                        if record.get('FIO') != fio or record.get('Role') != role.value:
-                            records_to_update.append(record)
-
-                    if records_to_update:
-                        logger.info(f"Обновляем {len(records_to_update)} записи(ей) для {mask_pii(fio)}")
-                        for record in records_to_update:
-                            logger.debug(
-                                f"Обновление записи FIO={mask_pii(record.get('FIO'))}→{mask_pii(fio)}, Role={record.get('Role')}→{role.value}")
-                            success = await update_auth(record['Id'], {'FIO': fio, 'Role': role.value})
-                            if success:
-                                updated_count += 1
-                    else:
-                        logger.debug(f"Не требуется обновление")
-
-                    # Добавляем новые мобильные телефоны
-                    existing_phones = {r.get('Phone', '') for r in existing_records}
-
-                    new_phones = [phone for phone in mobile_phones if phone and phone not in existing_phones]
-                    if new_phones:
-                        logger.info(f"Добавляем {len(new_phones)} новых телефонов для {mask_pii(fio)}")
-                        for phone in new_phones:
-                            auth_record = {
-                                'SNILS': snils,
-                                'FIO': fio,
-                                'Phone': phone,
-                                'Role': role.value,
-                                'ID_messenger': ''
-                            }
-                            logger.debug(f"Создание новой записи с телефоном: {mask_pii(phone)}")
-                            success = await create_auth(auth_record)
-                            if success:
-                                created_count += 1
-
-                # Для новых сотрудников запускаю создание пульс-опросов
-                if date_employment:
-                    seven_days_ago = datetime.now().date() - relativedelta(days=7)
-                    if date_employment > seven_days_ago:
-                        logger.info(f"Работает меньше недели - создаём пульс-опросы для {mask_pii(pivot_user.get('FIO'))}")
-                        creator = PulseTaskCreator()
-                        created = await creator.create_tasks(pivot_user)
-                        if created:
-                            logger.info(f"Созданы пульс-опросы для {mask_pii(pivot_user.get('FIO'))}")
-                        else:
-                            logger.debug(f"Пульс-опросы не требуются для {mask_pii(pivot_user.get('FIO'))}")
-
-
-            except Exception as e:
-                logger.error(
-                    f"Ошибка обработки пользователя {mask_pii(snils)} ({mask_pii(pivot_user.get('FIO', 'нет ФИО'))}): {e}",
-                    exc_info=True)
-
-        # Удаляем записи архивных пользователей
-        auth_users_updated = await read_auth()
-        deleted_count = 0
-
-        for snils, pivot_user in archived_pivot_users.items():
-            if snils in auth_users_updated:
-                try:
-                    records_to_delete = auth_users_updated[snils]
-                    logger.info(f"Удаление {len(records_to_delete)} записей архивного пользователя: СНИЛС={mask_pii(snils)}")
-
-                    for record in records_to_delete:
-                        success = await delete_auth(record['Id'])
-                        if success:
-                            deleted_count += 1
-                except Exception as e:
-                    logger.error(f"Ошибка удаления архивного пользователя {mask_pii(snils)}: {e}", exc_info=True)
+            result = _sync_active_user(snils, pivot_user, auth_users, three_months_ago, seven_days_ago)
+            records_to_create.extend(result['create'])
+            records_to_update.extend(result['update'])
+            skipped_count += result['skipped']
+            evict_ids.extend(result['evict'])
+            if result['pulse']:
+                pulse_users.append(pivot_user)
+
+        # Записываем изменения пакетами вместо запроса на каждую строку
+        created_count = await create_auth_bulk(records_to_create)
+        updated_count = await update_auth_bulk(records_to_update)
+
+        # Удаляем записи архивных пользователей.
+        # Для архивных СНИЛС выше ничего не создавалось, поэтому первого снимка таблицы достаточно
+        record_ids = []
+        for snils in archived_pivot_users.keys() & auth_users.keys():
+            records_to_delete = auth_users[snils]
+            logger.info(f"Удаление {len(records_to_delete)} записей архивного пользователя: СНИЛС={mask_pii(snils)}")
+            record_ids.extend(record['Id'] for record in records_to_delete)
+            evict_ids.extend(record['ID_messenger'] for record in records_to_delete if record.get('ID_messenger'))
+
+        deleted_count = await delete_auth_bulk(record_ids)
+
+        # Роль и доступ в кеше бота не должны пережить изменение или удаление строки синхронизацией
+        for id_messenger in evict_ids:
+            clear_user_auth(str(id_messenger))
+
+        # Пульс-опросы создаём после записи таблицы авторизации, параллельно с ограничением нагрузки
+        if pulse_users:
+            semaphore = asyncio.Semaphore(SYNC_CONCURRENCY)
+            await asyncio.gather(*(_create_pulse_tasks(pivot_user, semaphore) for pivot_user in pulse_users))
 
         logger.info("Синхронизация авторизации завершена")
         logger.info(f"ИТОГО: создано={created_count}, обновлено={updated_count}, удалено={deleted_count}, пропущено={skipped_count}")
@@ -223,45 +255,50 @@ async def sync_auth():
 async def start_sync_scheduler():
     logger.info("Планировщик задач запущен")
 
-    await asyncio.gather(
-        run_daily_task(
-            name="Синхронизация авторизационной таблицы",
-            times=sync_auth_times,
-            task=sync_auth,
-        ),
-        run_daily_task(
-            name="Проверка ролей",
-            times=roles_check_time,
-            task=check_user_roles_daily,
-        ),
-    )
-
-
-async def run_daily_task(
-    *,
-    name: str,
-    times: Iterable[time],
-    task: Callable[[], Awaitable[None]],
-):
-    logger.info(
-        f"{name} будет запускаться в "
-        f"{', '.join(t.strftime('%H:%M') for t in times)} МСК"
-    )
+    await run_daily_tasks([
+        ("Синхронизация авторизационной таблицы", sync_auth_times, sync_auth),
+        ("Проверка ролей", roles_check_time, check_user_roles_daily),
+    ])
 
-    while True:
-        now_utc = datetime.utcnow()
-        now_msk = now_utc + timedelta(hours=3)
-
-        # ищем ближайшее время запуска
-        next_run = min(
-            (
-                datetime.combine(now_msk.date(), t)
-                + (timedelta(days=1) if datetime.combine(now_msk.date(), t) <= now_msk else timedelta())
-                for t in times
-            )
+
+def _next_run_after(times: List[time], moment: datetime) -> datetime:
+    """
+    Ближайшее время запуска строго позже moment (МСК).
+    times должен быть отсортирован: первое время позже текущего сегодня, иначе первое завтра
+    """
+    today = moment.date()
+    i = bisect_right(times, moment.time().replace(tzinfo=None))
+    if i < len(times):
+        return datetime.combine(today, times[i], tzinfo=MSK)
+    return datetime.combine(today + timedelta(days=1), times[0], tzinfo=MSK)
+
+
+async def run_daily_tasks(schedule: Iterable[Tuple[str, Iterable[time], Callable[[], Awaitable[None]]]]):
+    """
+    Один планировщик на все ежедневные задачи: куча (время следующего запуска, номер задачи).
+    Спит до ближайшего запуска, выполняет задачу и кладёт её следующий запуск обратно в кучу.
+    """
+    # Времена запуска сортируем один раз — список может прийти любым итерируемым
+    entries = [(name, sorted(times), task) for name, times, task in schedule]
+
+    now_msk = datetime.now(MSK)
+    heap = []
+    for i, (name, times, _) in enumerate(entries):
+        logger.info(
+            f"{name} будет запускаться в "
+            f"{', '.join(t.strftime('%H:%M') for t in times)} МСК"
         )
+        heap.append((_next_run_after(times, now_msk), i))
+    heapq.heapify(heap)
+
+    while True:
+        next_run, i = heap[0]
+        delay = (next_run - datetime.now(MSK)).total_seconds()
+        if delay > 0:
+            await asyncio.sleep(delay)
 
-        await asyncio.sleep((next_run - now_msk).total_seconds())
+        heapq.heappop(heap)
+        name, times, task = entries[i]
 
         try:
             logger.info(f"Запуск задачи: {name}")
@@ -269,4 +306,6 @@ async def run_daily_task(
         except Exception:
             logger.exception(f"Ошибка в задаче {name}")
 
-        await asyncio.sleep(5)  # защита от повторного запуска
+        # Следующий запуск — строго после запланированного и после окончания задачи,
+        # поэтому тот же слот не повторится, а пропущенные за время работы слоты этой задачи не догоняются
+        heapq.heappush(heap, (_next_run_after(times, max(next_run, datetime.now(MSK))), i))
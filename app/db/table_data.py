@@ -1,11 +1,16 @@
 import logging
 from typing import List, Dict
 
+from cachetools import TTLCache
+
 from config import Config
-from app.db.nocodb_client import NocoDBClient
+from app.db.nocodb_client import nocodb_client
 
 logger = logging.getLogger(__name__)
 
+# table_id -> строки таблицы; общий снимок для справочника контактов и проверки ролей
+table_snapshot_cache = TTLCache(maxsize=8, ttl=300)
+
 
 async def fetch_table(table_id: str = "empty", app: str = "HR", limit: int = None, offset: int = None) -> List[Dict]:
     """
@@ -28,12 +33,30 @@ async def fetch_table(table_id: str = "empty", app: str = "HR", limit: int = Non
         elif table_id == "empty" and app == 'HR':
             table_id = Config.MAIN_MENU_EMPLOYEE_ID
 
-        async with NocoDBClient() as client:
-            return await client.get_all(
-                table_id=table_id,
-                limit=limit if limit else 1000,
-                offset=offset if offset else 0
-            )
+        return await nocodb_client.get_all(
+            table_id=table_id,
+            limit=limit if limit else 1000,
+            offset=offset if offset else 0
+        )
     except Exception as e:
         logger.error(f"Ошибка fetch_table {table_id}: {e}")
-        return []
\ No newline at end of file
+        return []
+
+
+async def refresh_table_snapshot(table_id: str, app: str = "USER") -> List[Dict]:
+    """Загружает таблицу заново и кладёт её строки в общий кеш снимков"""
+    records = await fetch_table(table_id=table_id, app=app)
+    if records:
+        # Пустой ответ не кешируем — это может быть ошибка запроса
+        table_snapshot_cache[table_id] = records
+    return records
+
+
+async def load_table_snapshot(table_id: str, app: str = "USER") -> List[Dict]:
+    """
+    Возвращает строки таблицы из общего кеша снимков, при промахе загружает их.
+    Индексов не строит: кому нужен поиск, строит его поверх снимка сам
+    """
+    if table_id in table_snapshot_cache:
+        return table_snapshot_cache[table_id]
+    return await refresh_table_snapshot(table_id, app)
@@ -1,4 +1,3 @@
-import pprint
 import re
 import logging
 import aiohttp
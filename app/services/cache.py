@@ -8,6 +8,12 @@ logger = logging.getLogger(__name__)
 # user_id -> role
 auth_cache = TTLCache(maxsize=2000, ttl=3600)
 
+# ID_messenger (строкой) -> роль для RoleChecker.get_role. Роль меняется редко, поэтому держим её минуту
+role_cache = TTLCache(maxsize=2000, ttl=60)
+
+# user_id пользователей без доступа — храним недолго, чтобы не ходить в NocoDB на каждый апдейт
+denied_cache = TTLCache(maxsize=2000, ttl=60)
+
 
 async def get_user_access_and_role(user_id: int) -> tuple[bool, str | None]:
     """
@@ -21,11 +27,16 @@ async def get_user_access_and_role(user_id: int) -> tuple[bool, str | None]:
         logger.info("Auth cache hit: %s -> %s", user_id, role)
         return True, role
 
+    if user_id in denied_cache:
+        logger.debug("Auth denied cache hit: %s", user_id)
+        return False, None
+
     # 2. cache miss → Seatable
     has_access, role = await check_id_messenger(str(user_id))
 
     if not has_access:
         logger.info("User %s has no access", user_id)
+        denied_cache[user_id] = True
         return False, None
 
     # 3. cache save
@@ -35,5 +46,12 @@ async def get_user_access_and_role(user_id: int) -> tuple[bool, str | None]:
     return True, role
 
 
-def clear_user_auth(user_id: int):
-    auth_cache.pop(user_id, None)
\ No newline at end of file
+def clear_user_auth(user_id: int | str):
+    """
+    Сбрасывает кешированные доступ и роль пользователя.
+    user_id — Telegram id: числом из апдейта или строкой из ID_messenger таблицы авторизации
+    """
+    key = int(user_id) if isinstance(user_id, str) and user_id.isdigit() else user_id
+    auth_cache.pop(key, None)
+    denied_cache.pop(key, None)
+    role_cache.pop(str(user_id), None)
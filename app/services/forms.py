@@ -3,7 +3,7 @@ from typing import List, Dict, Optional
 from datetime import datetime
 
 from config import Config
-from app.db.nocodb_client import NocoDBClient
+from app.db.nocodb_client import nocodb_client
 from app.services.utils import mask_pii
 
 logger = logging.getLogger(__name__)
@@ -126,21 +126,20 @@ async def save_form_answers(form_data: Dict) -> bool:
 
     try:
         # Получаем данные пользователя по ID_messenger
-        async with NocoDBClient() as client:
-            user_id = form_data.get('user_id')
-            where_filter = f"(ID_messenger,eq,{user_id})"
-            users = await client.get_all(
-                table_id=Config.AUTH_TABLE_ID,
-                where=where_filter,
-                limit=1
-            )
-
-            if users:
-                user = users[0]
-                form_data['user_fio'] = user.get('FIO')
-                form_data['user_phone'] = user.get('Phone')
-            else:
-                logger.warning(f"Пользователь с ID_messenger {user_id} не найден")
+        user_id = form_data.get('user_id')
+        where_filter = f"(ID_messenger,eq,{user_id})"
+        users = await nocodb_client.get_all(
+            table_id=Config.AUTH_TABLE_ID,
+            where=where_filter,
+            limit=1
+        )
+
+        if users:
+            user = users[0]
+            form_data['user_fio'] = user.get('FIO')
+            form_data['user_phone'] = user.get('Phone')
+        else:
+            logger.warning(f"Пользователь с ID_messenger {user_id} не найден")
 
         # Подготавливаем данные для записи
         prepared_data = await prepare_data_to_post_in_db(form_data)
@@ -154,16 +153,15 @@ async def save_form_answers(form_data: Dict) -> bool:
         logger.debug(f"ID таблицы для записи: {answers_table_id}")
 
         # Записываем ответы (NocoDB проигнорирует несуществующие колонки)
-        async with NocoDBClient() as client:
-            logger.debug(f"Отправка данных в таблицу ответов {answers_table_id}")
-            result = await client.create_record(table_id=answers_table_id, data=row_data)
-
-            if result:
-                logger.info(f"Ответы успешно сохранены. ID новой записи: {result[0].get('Id')}")
-                return True
-            else:
-                logger.error("Не удалось сохранить ответы")
-                return False
+        logger.debug(f"Отправка данных в таблицу ответов {answers_table_id}")
+        result = await nocodb_client.create_record(table_id=answers_table_id, data=row_data)
+
+        if result:
+            logger.info(f"Ответы успешно сохранены. ID новой записи: {result[0].get('Id')}")
+            return True
+        else:
+            logger.error("Не удалось сохранить ответы")
+            return False
 
     except Exception as e:
         logger.error(f"Ошибка при сохранении ответов: {e}", exc_info=True)
@@ -4,7 +4,7 @@ from datetime import datetime, date, timedelta
 from typing import Dict, List, Optional, Tuple
 
 from config import Config
-from app.db.nocodb_client import NocoDBClient
+from app.db.nocodb_client import nocodb_client
 from app.services.utils import mask_pii
 
 
@@ -139,7 +139,7 @@ class PulseTaskCreator:
         if not date_str:
             return None
         try:
-            return datetime.strptime(date_str, '%Y-%m-%d').date()
+            return date.fromisoformat(date_str)
         except (ValueError, TypeError):
             return None
 
@@ -198,22 +198,21 @@ class PulseTaskCreator:
         Проверяет, существует ли уже задача для данного пользователя и типа опроса в NocoDB
         """
         try:
-            async with NocoDBClient() as client:
-                # Создаем фильтр: snils AND Type == poll_type
-                where_filter = f"(SNILS,eq,{snils})~and(Type,eq,{poll_type})"
+            # Создаем фильтр: snils AND Type == poll_type
+            where_filter = f"(SNILS,eq,{snils})~and(Type,eq,{poll_type})"
 
-                tasks = await client.get_all(
-                    table_id=Config.PULSE_TASKS_ID,
-                    where=where_filter,
-                    limit=1  # Нужна только проверка существования
-                )
+            tasks = await nocodb_client.get_all(
+                table_id=Config.PULSE_TASKS_ID,
+                where=where_filter,
+                limit=1  # Нужна только проверка существования
+            )
 
-                exists = len(tasks) > 0
+            exists = len(tasks) > 0
 
-                if exists:
-                    logger.debug(f"Задача уже существует: {mask_pii(snils)} - {poll_type}")
+            if exists:
+                logger.debug(f"Задача уже существует: {mask_pii(snils)} - {poll_type}")
 
-                return exists
+            return exists
 
         except Exception as e:
             logger.error(f"Ошибка проверки существования задачи: {e}")
@@ -258,14 +257,13 @@ class PulseTaskCreator:
 
         for attempt in range(1, max_retries + 1):
             try:
-                async with NocoDBClient() as client:
-                    result = await client.create_record(table_id=Config.PULSE_TASKS_ID, data=task_data)
-                    if result:
-                        logger.info(f"Задача на пульс-опрос создана: {mask_pii(task_data.get('FIO'))} - {task_data.get('Type')}")
-                        return True
-                    else:
-                        logger.error(f"Ошибка создания задачи: {mask_pii(task_data.get('FIO'))} - {task_data.get('Type')}")
-                        return False
+                result = await nocodb_client.create_record(table_id=Config.PULSE_TASKS_ID, data=task_data)
+                if result:
+                    logger.info(f"Задача на пульс-опрос создана: {mask_pii(task_data.get('FIO'))} - {task_data.get('Type')}")
+                    return True
+                else:
+                    logger.error(f"Ошибка создания задачи: {mask_pii(task_data.get('FIO'))} - {task_data.get('Type')}")
+                    return False
             except Exception as e:
                 if attempt < max_retries:
                     logger.warning(
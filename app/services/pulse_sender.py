@@ -4,10 +4,11 @@ from typing import Dict, List, Optional
 import asyncio
 from aiogram import Bot
 
-from app.db.nocodb_client import NocoDBClient
+from app.db.nocodb_client import nocodb_client
 from config import Config
 from app.db.table_data import fetch_table
-from app.services.utils import mask_pii
+from app.db.auth_table_crud import get_auth_by_snils
+from app.services.utils import mask_pii, MSK
 from telegram.content import prepare_telegram_message
 
 
@@ -15,6 +16,9 @@ logger = logging.getLogger(__name__)
 
 sending_time = time(11, 00)
 
+# Сколько пульс-опросов отправляется одновременно — с запасом ниже лимитов Telegram на рассылку
+PULSE_SEND_CONCURRENCY = 8
+
 
 class PulseSender:
     """Отправляет пульс-опросы пользователям"""
@@ -52,22 +56,27 @@ class PulseSender:
             sent_tasks = []
             failed_tasks = []
 
-            for task in tasks_to_send:
-                try:
-                    success = await self._send_single_pulse(task, poll_content)
-                    if success:
-                        sent_tasks.append(task)
-                        # Обновляем статус задачи на "sent"
-                        await self._update_task_status(task.get('Id'), 'sent')
-                    else:
-                        failed_tasks.append(task)
-                        # Обновляем статус задачи на "declined"
-                        await self._update_task_status(task.get('Id'), 'declined')
+            # Задачи независимы: поиск ID_messenger и отправку выполняем параллельно с ограничением
+            semaphore = asyncio.Semaphore(PULSE_SEND_CONCURRENCY)
+
+            async def send_task(task: Dict) -> bool:
+                async with semaphore:
+                    try:
+                        success = await self._send_single_pulse(task, poll_content)
+                    except Exception as e:
+                        logger.error(f"Ошибка отправки задачи {task.get('Id')}: {e}")
+                        success = False
+                    (sent_tasks if success else failed_tasks).append(task)
+                    # Статус пишем сразу после отправки: при падении посреди рассылки
+                    # уже доставленные опросы не останутся в "waiting"
+                    return await self._update_task_status(task.get('Id'), 'sent' if success else 'declined')
 
-                except Exception as e:
-                    logger.error(f"Ошибка отправки задачи {task.get('Id')}: {e}")
-                    failed_tasks.append(task)
-                    await self._update_task_status(task.get('Id'), 'declined')
+            written = await asyncio.gather(*(send_task(task) for task in tasks_to_send))
+
+            written_count = sum(written)
+            if written_count < len(sent_tasks) + len(failed_tasks):
+                logger.error(f"Статусы пульс-опросов записаны не все: {written_count} из "
+                             f"{len(sent_tasks) + len(failed_tasks)}")
 
             # Уведомляем админов о неудачных отправках
             if failed_tasks and admins:
@@ -82,8 +91,7 @@ class PulseSender:
     async def _get_tasks_for_today(self) -> List[Dict]:
         """Получает задачи которые нужно отправить сегодня"""
         try:
-            async with NocoDBClient() as client:
-                tasks = await client.get_all(table_id=Config.PULSE_TASKS_ID)
+            tasks = await nocodb_client.get_all(table_id=Config.PULSE_TASKS_ID)
 
             logger.debug(f'Найдены задачи на опросы в таблице.')
 
@@ -177,23 +185,16 @@ class PulseSender:
         Получает ID_messenger пользователя по СНИЛС через фильтрацию NocoDB
         """
         try:
-            async with NocoDBClient() as client:
-                # Фильтруем по SNILS, получаем только одну запись
-                where_filter = f"(SNILS,eq,{snils})"
-                users = await client.get_all(
-                    table_id=Config.AUTH_TABLE_ID,
-                    where=where_filter,
-                    limit=1
-                )
-
-                if not users:
-                    logger.warning(f"Пользователь с СНИЛС {mask_pii(snils)} не найден")
-                    return None
-
-                user = users[0]
-                messenger_id = user.get('ID_messenger')
-                logger.debug(f"Найден новичок для отправки {messenger_id}")
-                return str(messenger_id) if messenger_id else None
+            # У пользователя по записи на каждый телефон, ID_messenger есть только у той, через которую он вошёл
+            users = await get_auth_by_snils(snils)
+
+            if not users:
+                logger.warning(f"Пользователь с СНИЛС {mask_pii(snils)} не найден")
+                return None
+
+            messenger_id = next((user['ID_messenger'] for user in users if user.get('ID_messenger')), None)
+            logger.debug(f"Найден новичок для отправки {messenger_id}")
+            return str(messenger_id) if messenger_id else None
 
         except Exception as e:
             logger.error(f"Ошибка получения ID_messenger для {mask_pii(snils)}: {e}")
@@ -307,18 +308,17 @@ class PulseSender:
                 "Sent_date": datetime.now().isoformat() if status == 'sent' else None
             }
 
-            async with NocoDBClient() as client:
-                await client.update_record(
-                    table_id=Config.PULSE_TASKS_ID,
-                    record_id=task_id,
-                    data=update_data
-                )
+            await nocodb_client.update_record(
+                table_id=Config.PULSE_TASKS_ID,
+                record_id=task_id,
+                data=update_data
+            )
 
-                logger.debug(f"Статус задачи {task_id} обновлен на {status}")
-                return True
+            logger.debug(f"Статус задачи {task_id} обновлен на {status}")
+            return True
 
         except Exception as e:
-            logger.error(f"Ошибка при обновлении статуса задачи: {e}")
+            logger.error(f"Ошибка при обновлении статуса задачи {task_id}: {e}")
             return False
 
 
@@ -392,11 +392,9 @@ async def _wait_until(target_time: time):
     """
     Ждет до указанного времени по Москве
     """
-    now_utc = datetime.utcnow()
-    moscow_offset = timedelta(hours=3)
-    now_msk = now_utc + moscow_offset
+    now_msk = datetime.now(MSK)
 
-    next_run = datetime.combine(now_msk.date(), target_time)
+    next_run = datetime.combine(now_msk.date(), target_time, tzinfo=MSK)
 
     if next_run < now_msk:
         next_run = next_run + timedelta(days=1)
@@ -1,13 +1,28 @@
 import re
 import html
 import logging
+from datetime import timedelta, timezone
 from typing import Optional, List
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from app.db.table_data import fetch_table
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Московское время для планировщиков. Без базы часовых поясов (tzdata) — фиксированный UTC+3, он совпадает с MSK
+try:
+    MSK = ZoneInfo("Europe/Moscow")
+except ZoneInfoNotFoundError:
+    MSK = timezone(timedelta(hours=3), "MSK")
+
+# Регулярные выражения компилируем один раз при импорте модуля
+_NON_DIGIT_RE = re.compile(r'\D')
+_PHONES_SEPARATOR_RE = re.compile(r'[,;]')
+_COMMA_SPLIT_RE = re.compile(r'\s*,\s*')
+# email с доменами mavis.ru или votonia.ru, регистр не важен
+_RESTRICTED_EMAIL_RE = re.compile(r'[a-zA-Z0-9._%+-]+@(mavis\.ru|votonia\.ru)\b', re.IGNORECASE)
+
 
 def normalize_phones_string(phones_string: str) -> List[str]:
     """Нормализует строку с несколькими телефонами."""
@@ -18,7 +33,7 @@ def normalize_phones_string(phones_string: str) -> List[str]:
 
     # Шаг 1: Разделяем по явным разделителям (запятая, точка с запятой)
     # Сначала разбиваем по запятым и точкам с запятой
-    parts = re.split(r'[,;]', phones_string)
+    parts = _PHONES_SEPARATOR_RE.split(phones_string)
 
     normalized_phones = []
 
@@ -41,7 +56,7 @@ def normalize_phones_string(phones_string: str) -> List[str]:
             # Но только если это не городской номер (городской может быть с пробелами)
 
             # Проверяем, не является ли это городским номером с пробелами
-            digits_in_part = re.sub(r'\D', '', part)
+            digits_in_part = _NON_DIGIT_RE.sub('', part)
             if len(digits_in_part) == 7:
                 # Это городской номер с пробелами/дефисами
                 normalized_city = normalize_phone(part)
@@ -69,7 +84,7 @@ def normalize_phone(raw: Optional[str]) -> Optional[str]:
         return None
 
     # Удаляем все нецифровые символы
-    digits = re.sub(r'\D', '', raw)
+    digits = _NON_DIGIT_RE.sub('', raw)
 
     # Если цифр нет
     if not digits:
@@ -136,7 +151,7 @@ def values_to_set(val) -> set[str]:
     result = set()
 
     def split_and_add(s: str):
-        for part in re.split(r'\s*,\s*', s):
+        for part in _COMMA_SPLIT_RE.split(s):
             part = part.strip()
             if part:
                 result.add(part)
@@ -167,19 +182,11 @@ def contains_restricted_emails(text: str) -> bool:
     Проверяет, содержит ли текст email с доменами mavis.ru или votonia.ru
     Возвращает True если находит ограниченные email
     """
-    import re
-
     if not text:
         return False
 
-    # Паттерн для поиска email с доменами mavis.ru или votonia.ru
-    # Учитываем разные форматы: example@mavis.ru, example@votonia.ru
-    pattern = r'[a-zA-Z0-9._%+-]+@(mavis\.ru|votonia\.ru)\b'
-
-    # Игнорируем регистр
-    matches = re.findall(pattern, text, re.IGNORECASE)
-
-    return len(matches) > 0
+    # Достаточно первого совпадения, собирать все не нужно
+    return _RESTRICTED_EMAIL_RE.search(text) is not None
 
 
 def mask_pii(value, visible: int = 3) -> str:
@@ -209,6 +216,8 @@ _BOLD_RE = re.compile(r"\*\*([^*]+)\*\*")
 # голый url (после того как markdown-ссылки уже вырезаны в плейсхолдеры)
 _BARE_URL_RE = re.compile(r"(?<!href=\")(?<!\">)(https?://[^\s<]+)")
 
+_LINK_PLACEHOLDER_RE = re.compile(r"\x00LINK(\d+)\x00")
+
 
 def markdown_to_html(text: str) -> str:
     """
@@ -253,7 +262,7 @@ def markdown_to_html(text: str) -> str:
         safe_text = html.escape(link_text, quote=False)
         return f'<a href="{html.escape(url, quote=True)}">{safe_text}</a>'
 
-    text = re.sub(r"\x00LINK(\d+)\x00", _restore_link, text)
+    text = _LINK_PLACEHOLDER_RE.sub(_restore_link, text)
 
     return text
 
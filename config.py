@@ -9,6 +9,8 @@ class Config:
 
     NOCOBD_SERVER = os.getenv("NOCOBD_SERVER")
     NOCOBD_API_TOKEN = os.getenv("NOCOBD_API_TOKEN")
+    # Сколько соединений с NocoDB держит общий пул
+    NOCODB_POOL_SIZE = int(os.getenv("NOCODB_POOL_SIZE", "64"))
 
     MAIN_MENU_EMPLOYEE_ID = os.getenv("MAIN_MENU_EMPLOYEE_ID")
     MAIN_MENU_NEWCOMER_ID = os.getenv("MAIN_MENU_NEWCOMER_ID")
@@ -3,6 +3,8 @@ import logging
 from aiogram import Bot, Dispatcher
 from aiogram.client.session.aiohttp import AiohttpSession
 
+from app.db.contacts import start_directory_refresher
+from app.db.nocodb_client import nocodb_client
 from app.db.sync_1c import start_sync_scheduler
 from app.services.fsm import state_manager
 from config import Config
@@ -27,10 +29,14 @@ async def main():
     bot = Bot(token=Config.BOT_TOKEN, session=session)
     dp = Dispatcher()
 
-    # Планировщик синхронизации таблицы авторизации + рассылки пульс-опросов
+    # Общая сессия NocoDB для частых запросов
+    await nocodb_client.start()
+
+    # Планировщик синхронизации таблицы авторизации + рассылки пульс-опросов + обновление справочника
     scheduler_tasks = [
         asyncio.create_task(start_sync_scheduler()),
-        asyncio.create_task(start_pulse_sender_scheduler(bot))
+        asyncio.create_task(start_pulse_sender_scheduler(bot)),
+        asyncio.create_task(start_directory_refresher([Config.PIVOT_TABLE_ID]))
     ]
 
     # Регистрация роутеров
@@ -53,6 +59,9 @@ async def main():
             task.cancel()
         logger.info("Планировщики остановлены")
 
+        # Закрываем общую сессию NocoDB
+        await nocodb_client.close()
+
         # Сохраняем состояние FSM в БД
         state_manager.save_to_db()
         logger.info("Состояние FSM сохранено в SQLite")
@@ -60,4 +69,11 @@ async def main():
         logger.info("Бот остановлен")
 
 if __name__ == "__main__":
+    # uvloop быстрее стандартного цикла событий; если не установлен (например, на Windows) — работаем без него
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+
     asyncio.run(main())
\ No newline at end of file
@@ -1,4 +1,3 @@
-import pprint
 import re
 import html
 import logging
@@ -34,6 +34,7 @@ from app.db.contacts import (
     give_unit_data,
     format_unit_text,
     format_ats_internal,
+    load_directory,
 )
 from app.clients.ai_agent_client import ask_agent, extract_tool_call, AIAgentError
 
@@ -252,8 +253,8 @@ async def _ai_search_contacts(message: Message, query: str):
         )
         return
 
-    employees = await fetch_table(table_id=Config.PIVOT_TABLE_ID, app="USER")
-    found = await give_employee_data("FIO", query, employees, "both")
+    employees, index = await load_directory(Config.PIVOT_TABLE_ID)
+    found = await give_employee_data("FIO", query, employees, "both", index=index)
     await _show_ai_employees(message, found, group_ats=False)
 
 
@@ -270,7 +271,7 @@ async def _ai_search_department(message: Message, query: str, table_id: str):
         )
         return
 
-    employees = await fetch_table(table_id=table_id, app="USER")
+    employees, _ = await load_directory(table_id)
     found = await give_employee_data("Department", query, employees)
     await _show_ai_employees(message, found, group_ats=True)
 
@@ -288,7 +289,7 @@ async def _ai_search_unit(message: Message, query: str, table_id: str):
         )
         return
 
-    unit_data = await fetch_table(table_id=table_id, app="USER")
+    unit_data, _ = await load_directory(table_id)
     found = await give_unit_data(query, unit_data)
 
     if not found:
@@ -4,7 +4,7 @@ from aiogram import Router, types, F
 from aiogram.filters import CommandStart
 from aiogram.types import ReplyKeyboardRemove
 
-from app.db.nocodb_client import NocoDBClient
+from app.db.nocodb_client import nocodb_client
 from app.db.roles import RoleChecker
 from app.services.cache import clear_user_auth, get_user_access_and_role
 from app.services.utils import normalize_phone, contains_restricted_emails, mask_pii
@@ -218,23 +218,22 @@ async def process_back_callback(callback_query: types.CallbackQuery):
         if current_menu and current_menu.startswith('content:'):
             _, current_table_id, current_row_id = current_menu.split(':')
 
-            async with NocoDBClient() as nocodb:
-                rows = await nocodb.get_all(
-                    table_id=current_table_id,
-                    where=f"(Id,eq,{current_row_id})"
-                )
-                if rows:
-                    current_row = rows[0]
-                    if current_row.get('Content_text') or current_row.get('Content_image'):
-                        button_content = prepare_telegram_message(
-                            text_content=current_row.get('Content_text', ''),
-                            image_url=current_row.get('Content_image')
-                        )
+            rows = await nocodb_client.get_all(
+                table_id=current_table_id,
+                where=f"(Id,eq,{current_row_id})"
+            )
+            if rows:
+                current_row = rows[0]
+                if current_row.get('Content_text') or current_row.get('Content_image'):
+                    button_content = prepare_telegram_message(
+                        text_content=current_row.get('Content_text', ''),
+                        image_url=current_row.get('Content_image')
+                    )
 
         # Удаляем текущее сообщение
         try:
             await callback_query.message.delete()
-        except:
+        except Exception:
             pass
 
         # Если был контент - постим его перед возвратом
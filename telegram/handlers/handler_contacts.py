@@ -5,12 +5,11 @@ from typing import List, Dict
 from aiogram import Router, types, F, Bot
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 
-from app.db.table_data import fetch_table
 from app.services.utils import mask_pii
 from config import Config
 from app.services.fsm import state_manager, AppStates
 from app.db.contacts import give_employee_data, format_employee_text, give_unit_data, format_unit_text, \
-    get_department_list, format_ats_internal
+    get_department_list, format_ats_internal, load_directory
 
 from telegram.handlers.filters import NameSearchFilter, SearchTypeFilter, ShopSearchFilter, DrugstoreSearchFilter
 from telegram.keyboards import SEARCH_TYPE_KEYBOARD, SEARCH_COMPANY_GROUP, BACK_TO_SEARCH_TYPE, \
@@ -41,7 +40,7 @@ async def process_contacts_callback(callback_query: types.CallbackQuery):
         # Удаляем предыдущее сообщение с меню
         try:
             await callback_query.message.delete()
-        except:
+        except Exception:
             pass
 
         # Отправляем сообщение с иллюстрацией (если есть)
@@ -104,10 +103,10 @@ async def handle_text_input_during_search_selection(message: Message):
         logger.info(f"Автоматический поиск по ФИО: {mask_pii(search_query)}")
 
         # Получаем данные сотрудников
-        employees = await fetch_table(table_id=Config.PIVOT_TABLE_ID, app='USER')
+        employees, index = await load_directory(Config.PIVOT_TABLE_ID)
 
         # Выполняем поиск
-        searched_employees = await give_employee_data("FIO", search_query, employees)
+        searched_employees = await give_employee_data("FIO", search_query, employees, index=index)
 
         # Показываем результаты
         await show_employee(searched_employees, message)
@@ -216,10 +215,10 @@ async def process_name_input(message: Message):
         logger.info(f"Поиск по ФИО: {mask_pii(search_query)}, сегмент: {selected_segment}")
 
         # Обращается по АПИ в таблицу со справочником и возвращает json с данными всех сотрудников
-        employees = await fetch_table(table_id=Config.PIVOT_TABLE_ID, app="USER")
+        employees, index = await load_directory(Config.PIVOT_TABLE_ID)
 
         # После поиска показываем результаты и кнопку Назад
-        searched_employees = await give_employee_data("FIO", search_query, employees, selected_segment)
+        searched_employees = await give_employee_data("FIO", search_query, employees, selected_segment, index=index)
 
         # Выводит сообщение с результатами поиска и показывает его, пока пользователь не нажмет Назад
         await show_employee(searched_employees, message)
@@ -357,7 +356,7 @@ async def handle_company_group_search(callback_query: types.CallbackQuery):
         # Удаляем предыдущее сообщение с меню
         try:
             await callback_query.message.delete()
-        except:
+        except Exception:
             pass
 
         # Отправляем сообщение
@@ -515,7 +514,8 @@ async def process_department_input(callback_query: types.CallbackQuery):
         else:
             table_id = Config.ATS_MAVIS_BOOK_ID
 
-        employees = await fetch_table(table_id=table_id, app="USER")
+        # Снимок справочника из кеша: фильтр по отделу проверяется на нашей стороне (NFKC + casefold)
+        employees, _ = await load_directory(table_id)
 
         # Фильтруем по отделу
         searched_employees = await give_employee_data("Department", search_query, employees)
@@ -572,7 +572,7 @@ async def process_shop_input(message: Message):
         logger.info(f"Поиск по магазина по адресу: {search_query}")
 
         # Обращается по АПИ в таблицу со справочником магазинов и возвращает список магазинов
-        shops_data = await fetch_table(table_id=Config.SHOP_TABLE_ID, app='USER')
+        shops_data, _ = await load_directory(Config.SHOP_TABLE_ID)
 
         # После поиска показываем результаты и кнопку Назад
         searched_shop = await give_unit_data(search_query, shops_data)
@@ -628,7 +628,7 @@ async def process_drugstore_input(message: Message):
         logger.info(f"Поиск по аптеки по адресу: {search_query}")
 
         # Обращается по АПИ в таблицу со справочником магазинов и возвращает список магазинов
-        drugstore_data = await fetch_table(table_id=Config.DRUGSTORE_TABLE_ID, app='USER')
+        drugstore_data, _ = await load_directory(Config.DRUGSTORE_TABLE_ID)
 
         # После поиска показываем результаты и кнопку Назад
         searched_drugstore = await give_unit_data(search_query, drugstore_data)
@@ -700,7 +700,7 @@ async def handle_search_back(callback: types.CallbackQuery):
         # Удаляем сообщение с результатами
         try:
             await callback.message.delete()
-        except:
+        except Exception:
             pass
 
         # Возвращаем к выбору типа поиска
@@ -749,7 +749,7 @@ async def handle_department_back(callback: types.CallbackQuery):
         # Удаляем сообщение с результатами
         try:
             await callback.message.delete()
-        except:
+        except Exception:
             pass
 
         # Возвращаем к выбору типа поиска
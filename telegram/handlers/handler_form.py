@@ -1,6 +1,5 @@
 import asyncio
 import logging
-import pprint
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 
@@ -168,7 +167,7 @@ async def handle_text_answer(message: types.Message):
                 message_id=form_data['last_question_message_id'],
                 reply_markup=None
             )
-        except:
+        except Exception:
             pass
 
     if form_data['current_question'] >= len(form_data['questions']):
@@ -207,7 +206,7 @@ async def handle_form_option(callback: types.CallbackQuery):
     # Удаляем клавиатуру у вопроса
     try:
         await callback.message.edit_reply_markup(reply_markup=None)
-    except:
+    except Exception:
         pass
 
     # Переходим к следующему вопросу или завершаем
@@ -404,7 +403,7 @@ async def handle_form_cancel(callback: types.CallbackQuery):
     # Удаляем клавиатуру у предыдущего сообщения
     try:
         await callback.message.edit_reply_markup(reply_markup=None)
-    except:
+    except Exception:
         pass
 
     # Создаем клавиатуру для возврата в главное меню
@@ -1,4 +1,3 @@
-import pprint
 import re
 import logging
 from typing import List, Dict, Optional, Tuple
@@ -6,7 +5,7 @@ from typing import List, Dict, Optional, Tuple
 from aiogram import Router, types
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, Message
 
-from app.db.nocodb_client import NocoDBClient
+from app.db.nocodb_client import nocodb_client
 from app.services.utils import contains_restricted_emails
 from config import Config
 from app.services.fsm import state_manager
@@ -143,7 +142,7 @@ async def process_menu_callback(callback_query: types.CallbackQuery):
         # Удаляем предыдущее сообщение и создаем новое
         try:
             await callback_query.message.delete()
-        except:
+        except Exception:
             pass
 
         # Отправляем новое сообщение с учетом типа контента
@@ -191,12 +190,11 @@ async def process_content_callback(callback_query: types.CallbackQuery):
         await state_manager.navigate_to_menu(user_id, content_key)
 
         # Получаем данные контента
-        async with NocoDBClient() as nocodb:
-            rows = await nocodb.get_all(
-                table_id=table_id,
-                where=f"(Id,eq,{row_id})"
-            )
-            row = rows[0] if rows else None
+        rows = await nocodb_client.get_all(
+            table_id=table_id,
+            where=f"(Id,eq,{row_id})"
+        )
+        row = rows[0] if rows else None
 
         if not row:
             await callback_query.answer("Контент не найден", show_alert=True)
@@ -205,7 +203,7 @@ async def process_content_callback(callback_query: types.CallbackQuery):
         # Удаляем предыдущее меню
         try:
             await callback_query.message.delete()
-        except:
+        except Exception:
             pass
 
         # Отправляем вложение (если есть)
@@ -247,11 +245,10 @@ async def handle_content_button(table_id: str, row_id: str, should_post_back: bo
     """
     logger.info(f"Обработка контента для table_id={table_id}, row_id={row_id}")
 
-    async with NocoDBClient() as nocodb:
-        rows = await nocodb.get_all(
-            table_id=table_id,
-            where=f"(Id,eq,{row_id})"
-        )
+    rows = await nocodb_client.get_all(
+        table_id=table_id,
+        where=f"(Id,eq,{row_id})"
+    )
 
     if not rows:
         logger.error(f"Ошибка загрузки данных таблицы {table_id}")
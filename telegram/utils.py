@@ -1,4 +1,3 @@
-import pprint
 import logging
 
 from aiogram import types